@@ -0,0 +1,185 @@
+"""Zoom-level point clustering for the meeting map.
+
+A supercluster-style hierarchy: meetings are projected to Web Mercator, then,
+from the most detailed zoom outwards, points closer than ``radius`` pixels are
+merged into weighted clusters.  Each zoom keeps a grid index so a map tile
+(or any bbox) is answered by looking at a handful of grid cells.
+"""
+import math
+from typing import Dict, List
+
+import numpy as np
+
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+RADIUS = 40
+EXTENT = 256
+
+
+def lng_x(lng:float) -> float:
+    """Longitude to Web Mercator x in [0, 1]."""
+    return lng / 360 + 0.5
+
+
+def lat_y(lat:float) -> float:
+    """Latitude to Web Mercator y in [0, 1]."""
+    lat = min(max(lat, -85.0511), 85.0511)
+    sin = math.sin(lat * math.pi / 180)
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return y
+
+
+def x_lng(x:float) -> float:
+    """Web Mercator x back to longitude."""
+    return (x - 0.5) * 360
+
+
+def y_lat(y:float) -> float:
+    """Web Mercator y back to latitude."""
+    y2 = (180 - y * 360) * math.pi / 180
+    return 360 * math.atan(math.exp(y2)) / math.pi - 90
+
+
+def tile_bbox(z:int, x:int, y:int) -> List[float]:
+    """Bounding box of an XYZ map tile.
+
+    Args:
+        z (int): zoom
+        x (int): tile column
+        y (int): tile row
+
+    Returns:
+        List[float]: [west, south, east, north] in degrees
+    """
+    n = 2 ** z
+    return [x_lng(x / n), y_lat((y + 1) / n), x_lng((x + 1) / n), y_lat(y / n)]
+
+
+class GridIndex:
+    """Uniform grid over points in [0, 1] Mercator space.
+
+    Kept as two flat arrays (cell keys in sorted order, and the point ids in
+    that order) rather than a dict of lists, so a snapshot preloaded before
+    forking stays shared between workers.
+
+    Args:
+        xs (np.ndarray): x coordinates
+        ys (np.ndarray): y coordinates
+        cell (float): grid cell size
+    """
+
+    def __init__(self, xs:np.ndarray, ys:np.ndarray, cell:float):
+        self.xs = xs
+        self.ys = ys
+        self.cell = cell
+        keys = ((xs // cell).astype(np.int64) << 32) | (ys // cell).astype(np.int64)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def range(self, minx:float, miny:float, maxx:float, maxy:float) -> np.ndarray:
+        """Ids of points inside a box."""
+        first_row = max(int(miny // self.cell), 0)
+        last_row = max(int(maxy // self.cell), 0)
+        found = []
+        for cx in range(max(int(minx // self.cell), 0), max(int(maxx // self.cell), 0) + 1):
+            start = np.searchsorted(self.keys, (cx << 32) | first_row, side='left')
+            end = np.searchsorted(self.keys, (cx << 32) | last_row, side='right')
+            found.append(self.order[start:end])
+        ids = np.concatenate(found) if found else np.array([], dtype=np.int64)
+        xs = self.xs[ids]
+        ys = self.ys[ids]
+        return ids[(xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy)]
+
+    def within(self, x:float, y:float, r:float) -> np.ndarray:
+        """Ids of points within distance ``r`` of (x, y)."""
+        ids = self.range(x - r, y - r, x + r, y + r)
+        return ids[(self.xs[ids] - x) ** 2 + (self.ys[ids] - y) ** 2 <= r * r]
+
+
+class ClusterIndex:
+    """Cluster hierarchy over a set of meeting locations.
+
+    Points with no usable coordinates are left out.  Single points in query
+    results carry their row position so the caller can look the meeting up.
+
+    Args:
+        lngs (np.ndarray): longitudes
+        lats (np.ndarray): latitudes
+        rows (np.ndarray, optional): row position reported for each point. 
+            Defaults to the point's own position.
+        radius (int, optional): cluster radius in pixels. Defaults to RADIUS.
+        max_zoom (int, optional): last zoom with clustering. Defaults to MAX_ZOOM.
+    """
+
+    def __init__(self, lngs:np.ndarray, lats:np.ndarray, rows:np.ndarray = None,
+                 radius:int = RADIUS, max_zoom:int = MAX_ZOOM):
+        self.radius = radius
+        self.max_zoom = max_zoom
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        valid = np.flatnonzero(~np.isnan(lngs) & ~np.isnan(lats))
+        rows = valid if rows is None else np.asarray(rows)[valid]
+        level = {'x': np.array([lng_x(lngs[i]) for i in valid], dtype=float),
+                 'y': np.array([lat_y(lats[i]) for i in valid], dtype=float),
+                 'count': np.ones(len(valid), dtype=int),
+                 'row': rows.astype(int)}
+        self.levels = {max_zoom + 1: level}
+        self.trees = {max_zoom + 1: GridIndex(level['x'], level['y'], self._r(max_zoom))}
+        for zoom in range(max_zoom, MIN_ZOOM - 1, -1):
+            level = self._cluster(level, self.trees[zoom + 1], zoom)
+            self.levels[zoom] = level
+            self.trees[zoom] = GridIndex(level['x'], level['y'], self._r(max(zoom - 1, 0)))
+
+    def _r(self, zoom:int) -> float:
+        """Cluster radius in Mercator units at a zoom."""
+        return self.radius / (EXTENT * 2 ** zoom)
+
+    def _cluster(self, level:Dict[str, np.ndarray], tree:GridIndex,
+                 zoom:int) -> Dict[str, np.ndarray]:
+        """Merge the points of the next zoom in that fall within the radius."""
+        r = self._r(zoom)
+        done = np.zeros(len(level['x']), dtype=bool)
+        xs, ys, counts, rows = [], [], [], []
+        for i in range(len(level['x'])):
+            if done[i]:
+                continue
+            done[i] = True
+            neighbours = [j for j in tree.within(level['x'][i], level['y'][i], r) if not done[j]]
+            if not neighbours:
+                xs.append(level['x'][i])
+                ys.append(level['y'][i])
+                counts.append(level['count'][i])
+                rows.append(level['row'][i])
+                continue
+            members = [i] + neighbours
+            done[neighbours] = True
+            weights = level['count'][members]
+            xs.append(float(np.average(level['x'][members], weights=weights)))
+            ys.append(float(np.average(level['y'][members], weights=weights)))
+            counts.append(int(weights.sum()))
+            rows.append(-1)
+        return {'x': np.array(xs, dtype=float), 'y': np.array(ys, dtype=float),
+                'count': np.array(counts, dtype=int), 'row': np.array(rows, dtype=int)}
+
+    def get_clusters(self, bbox:List[float], zoom:int) -> List[dict]:
+        """Clusters and single points inside a bounding box at a zoom.
+
+        Args:
+            bbox (List[float]): [west, south, east, north] in degrees
+            zoom (int): map zoom; past max_zoom every meeting is its own point
+
+        Returns:
+            List[dict]: items with lng, lat, count and row (-1 for clusters)
+        """
+        zoom = max(MIN_ZOOM, min(int(zoom), self.max_zoom + 1))
+        west, south, east, north = bbox
+        if west > east:
+            # Box crosses the antimeridian (the Chathams)
+            return self.get_clusters([west, south, 180, north], zoom) + \
+                   self.get_clusters([-180, south, east, north], zoom)
+        level = self.levels[zoom]
+        ids = self.trees[zoom].range(lng_x(west), lat_y(north), lng_x(east), lat_y(south))
+        return [{'lng': x_lng(level['x'][i]), 'lat': y_lat(level['y'][i]),
+                 'count': int(level['count'][i]), 'row': int(level['row'][i])}
+                for i in ids]
@@ -0,0 +1,68 @@
+"""Single-flight coalescing of identical concurrent computations.
+
+When many requests for the same thing arrive together (everyone opening
+"in-person / Auckland / today" just before meetings start, or the first burst
+after a refresh), only the first runs the computation.  The rest wait for it
+and share its result, up to a time limit after which they compute it
+themselves rather than hang on a stuck leader.
+"""
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """One in-flight computation that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time within a process.
+
+    Args:
+        timeout (float, optional): seconds a waiting thread gives the leader
+            before computing the result itself. Defaults to 10.
+    """
+
+    def __init__(self, timeout:float = 10):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key:Hashable, fn:Callable, *args, **kwargs) -> Any:
+        """Return ``fn(*args, **kwargs)``, sharing one call among concurrent
+        callers with the same key.
+
+        Args:
+            key (Hashable): identifies the computation; must include anything
+                the result depends on (e.g. the snapshot version)
+            fn (Callable): computation to run
+
+        Returns:
+            Any: result of the computation, from this thread or the leader
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(self.timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # Leader is taking too long - don't queue behind it
+            return fn(*args, **kwargs)
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
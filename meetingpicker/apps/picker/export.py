@@ -0,0 +1,295 @@
+"""Static export of the picker, for serving without Django.
+
+For busy weekends the picker can be served as plain files by the host's web
+server (Apache on cPanel).  ``export_site`` writes the start page and every
+step of the venue -> region -> day click path for the loaded snapshot into a
+directory: each response as ``<venue>/<region>/<day>/index.json``, under both
+spellings of the region that reach it (the page's, with "_" and "__", and the
+plain name the service worker prefetches).  Tables for every day are written
+whole, as the first and only page of ``rows/``.  Stylesheets and images the
+pages use are copied under content-hashed names, so they can be cached for
+good, and text files get gzip (and, with the brotli package, brotli)
+variants next to them, picked by the generated .htaccess.
+
+A manifest of content hashes is kept with the export: files whose content
+hasn't changed since the last export aren't written again, and files the
+snapshot no longer has are removed.  Place search (``/places/``) depends on
+what's typed and still needs Django.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+try:
+    import brotli
+except ImportError:  # Optional: exports get gzip variants only
+    brotli = None
+
+
+VENUES = ('in-person', 'online')
+EXPORT_MANIFEST = '.export.json'
+# Files given pre-compressed variants
+COMPRESSED_TYPES = ('.html', '.json', '.js', '.css')
+HTACCESS = r"""# Written by manage.py export_static
+Options -MultiViews
+DirectoryIndex index.html index.json
+AddType application/json .json
+AddType application/javascript .js
+AddEncoding gzip .gz
+AddEncoding br .br
+
+<Files ".export.json">
+    Require all denied
+</Files>
+
+# Serve a pre-compressed variant when the client accepts it
+<IfModule mod_rewrite.c>
+    RewriteEngine On
+    RewriteCond %{HTTP:Accept-Encoding} br
+    RewriteCond %{REQUEST_FILENAME}.br -f
+    RewriteRule ^(.+)$ $1.br [L]
+    RewriteCond %{HTTP:Accept-Encoding} gzip
+    RewriteCond %{REQUEST_FILENAME}.gz -f
+    RewriteRule ^(.+)$ $1.gz [L]
+</IfModule>
+<FilesMatch "\.html\.(gz|br)$">
+    ForceType text/html
+</FilesMatch>
+<FilesMatch "\.json\.(gz|br)$">
+    ForceType application/json
+</FilesMatch>
+<FilesMatch "\.js\.(gz|br)$">
+    ForceType application/javascript
+</FilesMatch>
+<FilesMatch "\.css\.(gz|br)$">
+    ForceType text/css
+</FilesMatch>
+
+<IfModule mod_headers.c>
+    <FilesMatch "\.(html|json|js|css)(\.gz|\.br)?$">
+        Header append Vary Accept-Encoding
+        Header set Cache-Control "no-cache"
+    </FilesMatch>
+    # Content-hashed assets never change
+    <FilesMatch "\.[0-9a-f]{12}\.\w+(\.gz|\.br)?$">
+        Header set Cache-Control "public, max-age=31536000, immutable"
+    </FilesMatch>
+</IfModule>
+"""
+
+
+def region_paths(region:str) -> List[str]:
+    """URL spellings of a region: the page's first, then the plain name.
+
+    The page swaps the first space for "_" and the first apostrophe for
+    "__" before sending a region (see sendRegion in base.html).
+
+    Args:
+        region (str): region name
+
+    Returns:
+        List[str]: distinct spellings
+    """
+    if region == 'SHOW ALL':
+        return [region]
+    page = region.replace(' ', '_', 1).replace("'", '__', 1)
+    return [page] if page == region else [page, region]
+
+
+def json_bytes(data:dict) -> bytes:
+    """Body of the JSON response for some data, as the views send it."""
+    return JsonResponse(data).content
+
+
+def hashed_name(name:str, content:bytes) -> str:
+    """File name with a hash of its content, as "modstyles.3f2a9c1b7d4e.css".
+
+    Args:
+        name (str): file name
+        content (bytes): file content
+
+    Returns:
+        str: hashed file name
+    """
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.md5(content).hexdigest()[:12]}{ext}'
+
+
+def hash_assets(files:Dict[str, bytes]) -> Dict[str, bytes]:
+    """Copy the static files the exported pages refer to under hashed names,
+    and point the references at the copies.
+
+    Args:
+        files (Dict[str, bytes]): exported files, by path
+
+    Returns:
+        Dict[str, bytes]: files, with the assets added
+    """
+    static_url = '/' + settings.STATIC_URL.strip('/') + '/'
+    reference = re.compile(re.escape(static_url) + r'([\w\-./]+)')
+    assets = {}
+    for path, content in files.items():
+        if not path.endswith(COMPRESSED_TYPES):
+            continue
+        text = content.decode('utf-8')
+        for name in set(reference.findall(text)):
+            if name not in assets:
+                found = finders.find(name)
+                if found is None:
+                    continue
+                with open(found, 'rb') as f:
+                    asset = f.read()
+                assets[name] = (hashed_name(name, asset), asset)
+            text = text.replace(static_url + name, static_url + assets[name][0])
+        files[path] = text.encode('utf-8')
+    for hashed, asset in assets.values():
+        files[static_url.strip('/') + '/' + hashed] = asset
+    return files
+
+
+def render_site() -> Dict[str, bytes]:
+    """Every file of the static site for the loaded snapshot.
+
+    Returns:
+        Dict[str, bytes]: file content, by path in the export
+    """
+    from meetingpicker.apps.picker.views import (SNAPSHOT, cached_picker_data,
+                                                  ordered_day_rows, ordered_days,
+                                                  rows_page, snapshot_manifest_data)
+    page = render_to_string('base.html').encode('utf-8')
+    files = {'index.html': page,
+             # Where the page's Go Back button goes
+             'nan/nan/nan/index.html': page,
+             'sw.js': render_to_string('sw.js').encode('utf-8'),
+             'snapshot.json': json_bytes(snapshot_manifest_data(SNAPSHOT.version,
+                                                                ordered_days()[0])),
+             '.htaccess': HTACCESS.encode('utf-8'),
+             }
+    for venue in VENUES:
+        data = cached_picker_data(venue, 'nan', 'nan')
+        files[f'{venue}/nan/nan/index.json'] = json_bytes(data)
+        for region in data['regions']:
+            if region == 'NONE':
+                continue
+            paths = region_paths(region)
+            step = {}
+            days = cached_picker_data(venue, paths[0], 'nan')
+            step['nan'] = json_bytes(days)
+            for day in days['days']:
+                step[day] = json_bytes(cached_picker_data(venue, paths[0], day))
+                if day == 'SHOW ALL':
+                    rows = ordered_day_rows(venue, paths[0], day, SNAPSHOT.version)
+                    step[f'{day}/rows'] = json_bytes(rows_page(rows, 0, max(len(rows), 1)))
+            for path in paths:
+                for name, content in step.items():
+                    files[f'{venue}/{path}/{name}/index.json'] = content
+    return hash_assets(files)
+
+
+def compressed(path:str, content:bytes) -> List[Tuple[str, bytes]]:
+    """Pre-compressed variants of a file, if it's a type that gets them.
+
+    Args:
+        path (str): file path
+        content (bytes): file content
+
+    Returns:
+        List[Tuple[str, bytes]]: path and content of each variant
+    """
+    if not path.endswith(COMPRESSED_TYPES):
+        return []
+    # No timestamp in the gzip header, so unchanged files compress the same
+    variants = [(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((path + '.br', brotli.compress(content)))
+    return variants
+
+
+def write_atomic(path:str, content:bytes) -> None:
+    """Write a file under a temporary name and move it into place, so the web
+    server never serves it half-written.
+
+    Args:
+        path (str): file path
+        content (bytes): file content
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def remove_files(out_dir:str, paths:Iterable[str]) -> None:
+    """Delete exported files and their variants, and any directories left empty.
+
+    Args:
+        out_dir (str): export directory
+        paths (Iterable[str]): file paths in the export
+    """
+    for path in paths:
+        target = os.path.join(out_dir, path)
+        for file in (target, target + '.gz', target + '.br'):
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+        directory = os.path.dirname(target)
+        while os.path.abspath(directory) != os.path.abspath(out_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def export_site(out_dir:str, workers:int = 8) -> Dict[str, int]:
+    """Export the static site for the loaded snapshot, rewriting only files
+    whose content has changed since the last export to the same directory.
+
+    Args:
+        out_dir (str): export directory
+        workers (int, optional): threads writing files. Defaults to 8.
+
+    Returns:
+        Dict[str, int]: number of files exported, written and removed
+    """
+    files = render_site()
+    manifest_path = os.path.join(out_dir, EXPORT_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (FileNotFoundError, ValueError):
+        previous = {}
+    hashes = {path: hashlib.sha256(content).hexdigest() for path, content in files.items()}
+
+    def write(path:str) -> bool:
+        target = os.path.join(out_dir, path)
+        if previous.get(path) == hashes[path] and os.path.exists(target):
+            return False
+        for variant, content in compressed(target, files[path]) + [(target, files[path])]:
+            write_atomic(variant, content)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        written = sum(pool.map(write, files))
+    stale = set(previous) - set(files)
+    remove_files(out_dir, stale)
+    write_atomic(manifest_path, json.dumps(hashes, indent=0, sort_keys=True).encode('utf-8'))
+    return {'files': len(files), 'written': written, 'removed': len(stale)}
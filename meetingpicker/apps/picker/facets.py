@@ -0,0 +1,177 @@
+"""Bitmap facet index for the meeting picker.
+
+Every facet value (a venue, region, day, meeting format or time-of-day bucket)
+owns one bitmap with a bit set for each meeting row that carries it.  Any mix of
+filters is then answered with bitwise AND/OR, and the count shown next to each
+option is a popcount on the same bitmaps, so no query re-scans the table.
+"""
+from typing import Dict, List
+
+import numpy as np
+from pandas import DataFrame, isnull
+
+from meetingpicker.utils.times import start_minutes
+
+
+FACETS = ('venue', 'region', 'day', 'format', 'time')
+# Facets where picking several values narrows the result (a meeting must carry
+# every format asked for).  All other facets widen it (Auckland OR Wellington).
+CONJUNCTIVE_FACETS = ('format',)
+# Time-of-day buckets, as [start, end) minutes past midnight
+TIME_BUCKETS = {'morning': (0, 12 * 60),
+                'afternoon': (12 * 60, 18 * 60),
+                'evening': (18 * 60, 24 * 60),
+                }
+# Hybrid meetings show up under both in-person and online, as in the picker
+VENUE_ALIASES = {'in-person': ('in-person', 'hybrid'),
+                 'online': ('online', 'hybrid'),
+                 'hybrid': ('hybrid',),
+                 }
+
+
+def popcount(bitmap:int) -> int:
+    """Count the set bits in a bitmap.
+
+    Args:
+        bitmap (int): bitmap
+
+    Returns:
+        int: number of meetings in the bitmap
+    """
+    return bin(bitmap).count('1')
+
+
+def to_bitmap(mask:np.ndarray) -> int:
+    """Pack a boolean row mask into an integer bitmap (bit i is row i).
+
+    Args:
+        mask (np.ndarray): boolean array, one entry per meeting row
+
+    Returns:
+        int: bitmap
+    """
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    return int.from_bytes(packed.tobytes(), 'little')
+
+
+def to_rows(bitmap:int, size:int) -> np.ndarray:
+    """Unpack a bitmap into the (ascending) row positions it contains.
+
+    Args:
+        bitmap (int): bitmap
+        size (int): number of rows the bitmap was built over
+
+    Returns:
+        np.ndarray: row positions
+    """
+    raw = np.frombuffer(bitmap.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder='little')[:size])
+
+
+class FacetIndex:
+    """One bitmap per facet value over a table of meetings.
+
+    Bit positions are row positions in the table the index was built from, so
+    results can be pulled back out with ``DataFrame.iloc``.
+    """
+
+    def __init__(self, meetings:DataFrame):
+        self.size = len(meetings)
+        self.all = (1 << self.size) - 1
+        self.bitmaps = {facet: {} for facet in FACETS}
+        venues = self._index(meetings['venue'])
+        for name, aliases in VENUE_ALIASES.items():
+            self.bitmaps['venue'][name] = 0
+            for alias in aliases:
+                self.bitmaps['venue'][name] |= venues.get(alias, 0)
+        self.bitmaps['region'] = self._index(meetings['region'])
+        self.bitmaps['day'] = self._index(meetings['Day'])
+        # The snapshot only keeps format names, joined with ', ' by the refresh,
+        # so a format whose name itself contains ', ' is indexed as two formats
+        self.bitmaps['format'] = self._index(meetings['Formats'], separator=', ')
+        minutes = np.array([start_minutes(value) for value in meetings['Start Time'].values])
+        for bucket, (start, end) in TIME_BUCKETS.items():
+            self.bitmaps['time'][bucket] = to_bitmap((minutes >= start) & (minutes < end))
+
+    def _index(self, column, separator:str = None) -> Dict[str, int]:
+        """Build a value -> bitmap mapping for one column.
+
+        Args:
+            column (Series): column of meeting values
+            separator (str, optional): split multi-valued cells on this. Defaults to None.
+
+        Returns:
+            Dict[str, int]: bitmap per distinct value
+        """
+        rows = {}
+        for row, value in enumerate(column.values):
+            if isnull(value) or value == '':
+                continue
+            values = str(value).split(separator) if separator else [str(value)]
+            for item in values:
+                item = item.strip()
+                if item:
+                    rows.setdefault(item, []).append(row)
+        bitmaps = {}
+        for value, positions in rows.items():
+            mask = np.zeros(self.size, dtype=bool)
+            mask[positions] = True
+            bitmaps[value] = to_bitmap(mask)
+        return bitmaps
+
+    def match(self, filters:Dict[str, List[str]], exclude:str = None) -> int:
+        """Bitmap of meetings matching every facet in ``filters``.
+
+        Args:
+            filters (Dict[str, List[str]]): selected values per facet
+            exclude (str, optional): facet to leave out, for facet counts. Defaults to None.
+
+        Returns:
+            int: bitmap of matching meetings
+        """
+        result = self.all
+        for facet, values in filters.items():
+            if facet not in self.bitmaps:
+                raise ValueError(f'Invalid facet: {facet}')
+            if facet == exclude or not values:
+                continue
+            bitmaps = [self.bitmaps[facet].get(value, 0) for value in values]
+            if facet in CONJUNCTIVE_FACETS:
+                for bitmap in bitmaps:
+                    result &= bitmap
+            else:
+                combined = 0
+                for bitmap in bitmaps:
+                    combined |= bitmap
+                result &= combined
+        return result
+
+    def counts(self, filters:Dict[str, List[str]]) -> Dict[str, Dict[str, int]]:
+        """Number of meetings each facet value would give alongside ``filters``.
+
+        Widening facets are counted against the other facets' selections only,
+        so every option in them keeps a meaningful count once one is picked.
+
+        Args:
+            filters (Dict[str, List[str]]): selected values per facet
+
+        Returns:
+            Dict[str, Dict[str, int]]: count per value, per facet
+        """
+        selected = self.match(filters)
+        counts = {}
+        for facet, bitmaps in self.bitmaps.items():
+            base = selected if facet in CONJUNCTIVE_FACETS else self.match(filters, exclude=facet)
+            counts[facet] = {value: popcount(base & bitmap) for value, bitmap in bitmaps.items()}
+        return counts
+
+    def rows(self, bitmap:int) -> np.ndarray:
+        """Row positions of the meetings in a bitmap.
+
+        Args:
+            bitmap (int): bitmap from ``match``
+
+        Returns:
+            np.ndarray: row positions
+        """
+        return to_rows(bitmap, self.size)
@@ -0,0 +1,454 @@
+"""End-to-end load test of the picker over HTTP.
+
+A synthetic snapshot is written to a scratch directory and the app is started
+on it as a real server: under WSGI with gunicorn (Django's runserver if
+gunicorn isn't installed), and under ASGI with uvicorn.  Virtual users then
+replay the page's click path against it - start page, venue, region, day,
+with SHOW ALL picked for the region and the day some of the time and its
+table followed page by page through ``rows/`` - each user starting its next
+visit as soon as the last one ends.  Once the test has run for its duration,
+it reports:
+
+- requests per second, and errors
+- p50/p95/p99 latency of each step and overall
+- memory of each server process: peak RSS, and PSS and private memory at the
+  end (from /proc, so Linux only)
+"""
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib.util import find_spec
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from meetingpicker.apps.picker.export import region_paths
+from meetingpicker.apps.picker.preload import memory_split
+from meetingpicker.apps.picker.snapshot import SNAPSHOT_FILE
+from meetingpicker.utils.venues import VENUE_FILE, split_venues
+
+
+INTERFACES = ('wsgi', 'asgi')
+STEPS = ('page', 'venue', 'region', 'day', 'rows')
+REGIONS = ('Northland', 'Auckland', 'Hamilton and Waikato', 'Tauranga and Rotorua',
+           "Hawke's Bay and Gisborne", 'Taranaki', 'Palmerston North and Whanganui',
+           'Porirua and Kapiti Coast', 'Hutt Valley and Masterton', 'Wellington',
+           'Upper South Island', 'West Coast - South Island', 'Christchurch and Canterbury',
+           'Dunedin, Otago and Southland')
+PLACES = ('Ponsonby', 'Mt Eden', 'Ōtāhuhu', 'Manurewa', 'Hillcrest', 'Te Aro', 'Karori',
+          'Petone', 'Riccarton', 'Whangārei', 'Onehunga', 'Papatoetoe')
+DAYS = ('SUNDAY', 'MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY')
+FORMATS = ('Open', 'Closed', 'Speaker', 'Discussion', 'Step Study', 'Beginners',
+           'Literature Study', 'Wheelchair Accessible')
+# Share of visits going to in-person meetings rather than online
+IN_PERSON_SHARE = 0.7
+START_PAGE = '/nan/nan/nan/'
+
+
+def synthetic_meetings(count:int, seed:int = 1) -> pd.DataFrame:
+    """Made-up meetings, in the form the refresh step publishes.
+
+    Args:
+        count (int): number of meetings
+        seed (int, optional): random seed. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: meetings with address fields, region and venue
+    """
+    rng = random.Random(seed)
+    halls = []
+    for i in range(max(count // 4, 1)):
+        halls.append({'Location Name': f'Hall {i}',
+                      'Street Address': f'{i + 1} Main Street',
+                      'Neighborhood': rng.choice(PLACES),
+                      'Town': rng.choice(('Auckland', 'Wellington', 'Christchurch')),
+                      'Zip Code': str(rng.randint(1000, 9999)),
+                      'region': rng.choice(REGIONS),
+                      'Longitude': round(rng.uniform(166.5, 178.5), 5),
+                      'Latitude': round(rng.uniform(-46.6, -34.4), 5)})
+    rows = []
+    for i in range(count):
+        venue = rng.choices(('in-person', 'online', 'hybrid'), weights=(6, 2, 2))[0]
+        hall = rng.choice(halls)
+        hour, minute = rng.randint(6, 21), rng.choice((0, 30))
+        row = {'id_bigint': 1000 + i,
+               'Meeting Name': f'Meeting {i}',
+               'Virtual Meeting Link': None if venue == 'in-person' else f'https://zoom.us/j/{1000 + i}',
+               'Virtual Meeting Additional Info': None if venue == 'in-person' else 'Passcode 123',
+               'Phone Meeting Dial-in Number': None}
+        for col in ('Location Name', 'Street Address', 'Neighborhood', 'Town', 'Borough',
+                    'County', 'Zip Code'):
+            row[col] = hall.get(col) if venue != 'online' else None
+        row.update({'Nation': 'New Zealand',
+                    'Additional Location Information': None,
+                    'Comments': 'Upstairs' if rng.random() < 0.2 else None,
+                    'Bus Lines': None,
+                    'Train Lines': None,
+                    'Contact 1 Email': None,
+                    'Day': rng.choice(DAYS),
+                    'Start Time': f'{(hour - 1) % 12 + 1}:{minute:02d} {"AM" if hour < 12 else "PM"}',
+                    'Duration': rng.choice(('1:00', '1:30')),
+                    'Formats': ', '.join(rng.sample(FORMATS, rng.randint(0, 3))),
+                    'Longitude': hall['Longitude'],
+                    'Latitude': hall['Latitude'],
+                    'region': hall['region'],
+                    'venue': venue})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def write_synthetic_snapshot(directory:str, count:int, seed:int = 1) -> None:
+    """Write a synthetic snapshot and venue table under a directory, where a
+    server started in that directory will load them.
+
+    Args:
+        directory (str): server working directory
+        count (int): number of meetings
+        seed (int, optional): random seed. Defaults to 1.
+    """
+    snapshot, venues = split_venues(synthetic_meetings(count, seed))
+    os.makedirs(os.path.join(directory, os.path.dirname(SNAPSHOT_FILE)), exist_ok=True)
+    venues.to_csv(os.path.join(directory, VENUE_FILE), index=False)
+    snapshot.to_csv(os.path.join(directory, SNAPSHOT_FILE), index=False)
+
+
+def server_command(interface:str, port:int, workers:int, threads:int,
+                   preload:bool = False) -> Tuple[str, List[str]]:
+    """Command line running the app under one interface.
+
+    Args:
+        interface (str): 'wsgi' or 'asgi'
+        port (int): port to listen on
+        workers (int): worker processes
+        threads (int): threads per WSGI worker
+        preload (bool, optional): load the app before forking workers. Defaults to False.
+
+    Raises:
+        RuntimeError: no server for the interface is installed
+
+    Returns:
+        Tuple[str, List[str]]: server name and command
+    """
+    bind = f'127.0.0.1:{port}'
+    if interface == 'wsgi':
+        if find_spec('gunicorn') is None:
+            # Single process, a thread per request
+            return 'runserver', [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+                                 'runserver', '--noreload', bind]
+        return 'gunicorn', [sys.executable, '-m', 'gunicorn', 'meetingpicker.wsgi:application',
+                            '--bind', bind, '--workers', str(workers), '--threads', str(threads),
+                            '--log-level', 'warning'] + (['--preload'] if preload else [])
+    if find_spec('uvicorn') is None:
+        raise RuntimeError('ASGI needs uvicorn installed')
+    return 'uvicorn', [sys.executable, '-m', 'uvicorn', 'meetingpicker.asgi:application',
+                       '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+                       '--log-level', 'warning']
+
+
+def wait_until_up(port:int, server:subprocess.Popen, timeout:float = 120) -> None:
+    """Wait for the server to answer the start page.
+
+    Args:
+        port (int): server port
+        server (subprocess.Popen): server process
+        timeout (float, optional): seconds to wait. Defaults to 120.
+
+    Raises:
+        RuntimeError: the server exited or didn't answer in time
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'Server exited with status {server.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', START_PAGE)
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server did not answer within {timeout:.0f}s')
+
+
+def process_tree(root:int) -> List[int]:
+    """A process and all its descendants (Linux only).
+
+    Args:
+        root (int): process id
+
+    Returns:
+        List[int]: process ids, root first
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [root]
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+    return tree
+
+
+def process_role(pid:int) -> str:
+    """'helper' for multiprocessing's resource tracker (uvicorn starts one),
+    'worker' for anything else under the server."""
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return 'helper' if b'resource_tracker' in f.read() else 'worker'
+    except OSError:
+        return 'worker'
+
+
+class MemorySampler:
+    """Record the memory of a server and its workers while a test runs.
+
+    Args:
+        root (int): server process id
+        interval (float, optional): seconds between samples. Defaults to 0.5.
+    """
+
+    def __init__(self, root:int, interval:float = 0.5):
+        self.root = root
+        self.interval = interval
+        self.peak = {}
+        self.last = {}
+        self.roles = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        for pid in process_tree(self.root):
+            try:
+                memory = memory_split(pid)
+            except OSError:
+                continue
+            self.last[pid] = memory
+            if pid not in self.roles:
+                self.roles[pid] = 'main' if pid == self.root else process_role(pid)
+            self.peak[pid] = max(self.peak.get(pid, 0), memory['rss'])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def report(self) -> List[Dict[str, float]]:
+        """Memory of each process seen, in MB: peak RSS, and PSS and private
+        memory when last sampled."""
+        return [{'pid': pid,
+                 'role': self.roles[pid],
+                 'rss_peak': self.peak[pid] / 1024,
+                 'pss': memory['pss'] / 1024,
+                 'private': memory['private'] / 1024}
+                for pid, memory in self.last.items()]
+
+
+class VirtualUser:
+    """One visitor clicking through the picker over a kept-alive connection.
+
+    Args:
+        port (int): server port
+        rng (random.Random): random choices of this user
+        show_all (float): chance of picking SHOW ALL, for region and for day
+        measure_from (float): monotonic time from which requests are recorded
+    """
+
+    def __init__(self, port:int, rng:random.Random, show_all:float, measure_from:float):
+        self.port = port
+        self.rng = rng
+        self.show_all = show_all
+        self.measure_from = measure_from
+        self.conn = None
+        self.timings = []
+        self.errors = []
+
+    def get(self, path:str, step:str) -> Tuple[int, bytes]:
+        """Request a path, reconnecting once if the server closed the connection."""
+        start = time.monotonic()
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.conn.request('GET', path)
+                response = self.conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        if start >= self.measure_from:
+            self.timings.append((step, time.monotonic() - start))
+            if response.status >= 400:
+                self.errors.append((step, response.status))
+        return response.status, body
+
+    def get_json(self, path:str, step:str) -> dict:
+        status, body = self.get(path, step)
+        if status != 200:
+            raise RuntimeError(f'{path}: HTTP {status}')
+        return json.loads(body)
+
+    def visit(self):
+        """One pass down the click path, choosing as a visitor to the page would."""
+        self.get(START_PAGE, 'page')
+        venue = 'in-person' if self.rng.random() < IN_PERSON_SHARE else 'online'
+        regions = self.get_json(f'/{venue}/nan/nan/', 'venue')['regions']
+        choices = [region for region in regions if region not in ('SHOW ALL', 'NONE')]
+        # The page goes straight to SHOW ALL regions for online meetings
+        if venue == 'online' or not choices or self.rng.random() < self.show_all:
+            region = 'SHOW ALL'
+        else:
+            region = self.rng.choice(choices)
+        region = quote(region_paths(region)[0])
+        days = self.get_json(f'/{venue}/{region}/nan/', 'region')['days']
+        if len(days) < 2 or self.rng.random() < self.show_all:
+            cursor = ''
+            while cursor is not None:
+                cursor = self.get_json(f'/{venue}/{region}/SHOW%20ALL/rows/?cursor={quote(cursor)}',
+                                       'rows')['cursor']
+        else:
+            self.get(f'/{venue}/{region}/{self.rng.choice(days[1:])}/', 'day')
+
+    def run(self, until:float):
+        while time.monotonic() < until:
+            try:
+                self.visit()
+            except (RuntimeError, ValueError, OSError, http.client.HTTPException) as error:
+                self.errors.append(('visit', str(error)))
+        if self.conn is not None:
+            self.conn.close()
+
+
+def percentiles(values:List[float]) -> Dict[str, float]:
+    """Count and p50/p95/p99 of latencies, in milliseconds."""
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return {'count': len(values), 'p50': p50, 'p95': p95, 'p99': p99}
+
+
+def run_load(port:int, concurrency:int, duration:float, warmup:float,
+             show_all:float, seed:int) -> dict:
+    """Replay the click path against a running server.
+
+    Args:
+        port (int): server port
+        concurrency (int): simultaneous virtual users
+        duration (float): seconds measured
+        warmup (float): seconds run first and not measured
+        show_all (float): chance of picking SHOW ALL, for region and for day
+        seed (int): random seed
+
+    Returns:
+        dict: requests, errors, throughput and latency per step
+    """
+    measure_from = time.monotonic() + warmup
+    until = measure_from + duration
+    users = [VirtualUser(port, random.Random(seed + i), show_all, measure_from)
+             for i in range(concurrency)]
+    threads = [threading.Thread(target=user.run, args=(until,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - measure_from
+    timings = [timing for user in users for timing in user.timings]
+    errors = [error for user in users for error in user.errors]
+    latency = {step: percentiles([seconds for name, seconds in timings if name == step])
+               for step in STEPS}
+    latency['all'] = percentiles([seconds for _, seconds in timings])
+    return {'requests': len(timings),
+            'errors': len(errors),
+            'error_samples': [str(error) for error in errors[:5]],
+            'seconds': elapsed,
+            'throughput': len(timings) / elapsed,
+            'latency': latency}
+
+
+def load_test(interface:str, meetings:int = 2000, workers:int = 2, threads:int = 4,
+              concurrency:int = 16, duration:float = 30, warmup:float = 3,
+              show_all:float = 0.3, preload:bool = False, port:int = 8765,
+              seed:int = 1) -> dict:
+    """Start the app under one interface on a synthetic snapshot, load it,
+    measure it and stop it.
+
+    Args:
+        interface (str): 'wsgi' or 'asgi'
+        meetings (int, optional): meetings in the synthetic snapshot. Defaults to 2000.
+        workers (int, optional): server worker processes. Defaults to 2.
+        threads (int, optional): threads per WSGI worker. Defaults to 4.
+        concurrency (int, optional): simultaneous virtual users. Defaults to 16.
+        duration (float, optional): seconds measured. Defaults to 30.
+        warmup (float, optional): seconds run first and not measured. Defaults to 3.
+        show_all (float, optional): chance of picking SHOW ALL, for region and
+            for day. Defaults to 0.3.
+        preload (bool, optional): build the snapshot before forking workers. Defaults to False.
+        port (int, optional): port to run the server on. Defaults to 8765.
+        seed (int, optional): random seed. Defaults to 1.
+
+    Returns:
+        dict: test settings, load results (see ``run_load``) and server memory
+    """
+    server_name, command = server_command(interface, port, workers, threads, preload)
+    with tempfile.TemporaryDirectory(prefix='picker-load-') as directory:
+        write_synthetic_snapshot(directory, meetings, seed)
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(settings.BASE_DIR),
+                                                            os.getenv('PYTHONPATH')])),
+                   DJANGO_SETTINGS_MODULE='meetingpicker.settings',
+                   DJANGO_SECRET=os.getenv('DJANGO_SECRET') or 'load-test',
+                   DEBUG='False',
+                   PRELOAD_SNAPSHOT=str(preload))
+        with open(os.path.join(directory, 'server.log'), 'w+') as log:
+            server = subprocess.Popen(command, cwd=directory, env=env,
+                                      stdout=log, stderr=subprocess.STDOUT)
+            try:
+                try:
+                    wait_until_up(port, server)
+                except RuntimeError as error:
+                    log.seek(0)
+                    raise RuntimeError(f'{server_name}: {error}\n{log.read()[-2000:]}')
+                sampler = MemorySampler(server.pid)
+                sampler.start()
+                results = run_load(port, concurrency, duration, warmup, show_all, seed)
+                sampler.stop()
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+                    server.wait()
+    return dict(results, interface=interface, server=server_name, meetings=meetings,
+                workers=1 if server_name == 'runserver' else workers,
+                concurrency=concurrency, show_all=show_all, preload=preload,
+                memory=sampler.report())
@@ -0,0 +1,31 @@
+"""Write the picker out as a static site, for serving without Django.
+
+    python manage.py export_static /home/nznaorg/public_html/meetings
+
+Exports the start page and every venue/region/day response for the current
+snapshot into the directory (see meetingpicker.apps.picker.export). Run it
+again after each refresh; only files that changed are rewritten.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Export the picker for the current snapshot as static files.'
+    # System checks import the URL conf, which loads the snapshot before it's needed
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the site to.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads writing files. Defaults to 8.')
+
+    def handle(self, *args, **options):
+        from meetingpicker.apps.picker.export import export_site
+        from meetingpicker.apps.picker.views import SNAPSHOT
+        start = time.perf_counter()
+        counts = export_site(options['directory'], workers=options['workers'])
+        self.stdout.write(f'Exported {counts["files"]} files for snapshot {SNAPSHOT.version} '
+                          f'({counts["written"]} written, {counts["removed"]} removed) '
+                          f'in {time.perf_counter() - start:.1f}s')
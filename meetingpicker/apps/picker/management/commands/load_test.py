@@ -0,0 +1,81 @@
+"""Load test the picker over HTTP, under WSGI and ASGI.
+
+    python manage.py load_test --interface both --workers 4 --concurrency 32 --duration 60
+    python manage.py load_test --interface wsgi --preload --json results.json
+
+Starts the app on a synthetic snapshot under gunicorn (WSGI) and uvicorn
+(ASGI), replays the page's click path against it, and reports throughput,
+latency percentiles and each server process's memory (see
+meetingpicker.apps.picker.loadtest). gunicorn and uvicorn aren't needed by
+the site, so install them to run it; without gunicorn, WSGI is tested on
+Django's runserver.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meetingpicker.apps.picker.loadtest import INTERFACES, STEPS, load_test
+
+
+class Command(BaseCommand):
+    help = 'Load test the picker over HTTP on a synthetic snapshot.'
+    # The servers load their own snapshot; this process doesn't need one
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', choices=INTERFACES + ('both',), default='both')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes.')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per WSGI worker.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous virtual users.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds measured.')
+        parser.add_argument('--warmup', type=float, default=3,
+                            help='Seconds run before measuring starts.')
+        parser.add_argument('--meetings', type=int, default=2000,
+                            help='Meetings in the synthetic snapshot.')
+        parser.add_argument('--show-all', type=float, default=0.3,
+                            help='Chance of picking SHOW ALL, for region and for day.')
+        parser.add_argument('--preload', action='store_true',
+                            help='Load the snapshot before forking workers (WSGI).')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', help='Also write the results to this file.')
+
+    def handle(self, *args, **options):
+        interfaces = INTERFACES if options['interface'] == 'both' else (options['interface'],)
+        reports = []
+        for interface in interfaces:
+            try:
+                report = load_test(interface, meetings=options['meetings'],
+                                   workers=options['workers'], threads=options['threads'],
+                                   concurrency=options['concurrency'],
+                                   duration=options['duration'], warmup=options['warmup'],
+                                   show_all=options['show_all'], preload=options['preload'],
+                                   port=options['port'], seed=options['seed'])
+            except RuntimeError as error:
+                raise CommandError(f'{interface.upper()}: {error}')
+            reports.append(report)
+            self.write_report(report)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(reports, f, indent=2)
+
+    def write_report(self, report:dict):
+        self.stdout.write(f'{report["interface"].upper()} ({report["server"]}, '
+                          f'{report["workers"]} workers, {report["concurrency"]} users, '
+                          f'{report["meetings"]} meetings): {report["requests"]} requests in '
+                          f'{report["seconds"]:.1f}s, {report["throughput"]:.1f} req/s, '
+                          f'{report["errors"]} errors')
+        for sample in report['error_samples']:
+            self.stdout.write(f'  error: {sample}')
+        self.stdout.write(f'{"step":>8} {"count":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for step in STEPS + ('all',):
+            latency = report['latency'][step]
+            if not latency['count']:
+                continue
+            self.stdout.write(f'{step:>8} {latency["count"]:>8} {latency["p50"]:>8.1f} '
+                              f'{latency["p95"]:>8.1f} {latency["p99"]:>8.1f}')
+        self.stdout.write(f'{"pid":>8} {"role":>8} {"peak rss MB":>12} {"pss MB":>8} {"private MB":>11}')
+        for row in sorted(report['memory'], key=lambda x: (x['role'] != 'main', x['pid'])):
+            self.stdout.write(f'{row["pid"]:>8} {row["role"]:>8} {row["rss_peak"]:>12.1f} '
+                              f'{row["pss"]:>8.1f} {row["private"]:>11.1f}')
+        self.stdout.write('')
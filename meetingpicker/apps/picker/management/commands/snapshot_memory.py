@@ -0,0 +1,79 @@
+"""Measure per-worker memory with and without a preloaded snapshot.
+
+    python manage.py snapshot_memory --workers 4
+    python manage.py snapshot_memory --workers 4 --no-preload
+
+Forks the given number of workers, has each serve every venue/region/day
+combination the picker offers, and reports each worker's shared and private
+memory once it's done.
+"""
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from meetingpicker.apps.picker.preload import memory_split, preload
+
+
+def serve_all() -> int:
+    """Run the picker's query and render path for every click-path combination.
+
+    Returns:
+        int: number of tables rendered
+    """
+    from meetingpicker.apps.picker.views import format_table, get_data
+    rendered = 0
+    for venue in ('in-person', 'online'):
+        for region in get_data('venue', {'venue': venue}):
+            if region == 'NONE':
+                continue
+            region = region.replace("'", '__').replace(' ', '_') if region != 'SHOW ALL' else region
+            for day in get_data('region', {'venue': venue, 'region': region}):
+                meetings = get_data('day', {'venue': venue, 'region': region, 'day': day})
+                if len(meetings):
+                    format_table(meetings)
+                    rendered += 1
+    return rendered
+
+
+class Command(BaseCommand):
+    help = 'Fork picker workers and report their shared versus private memory.'
+    # System checks import the URL conf, which would load the snapshot in the parent
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Load the snapshot in each worker instead of the parent.')
+
+    def handle(self, *args, **options):
+        if not options['no_preload']:
+            preload()
+        parent = memory_split()
+        read_end, write_end = os.pipe()
+        children = []
+        for _ in range(options['workers']):
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_end)
+                rendered = serve_all()
+                stats = dict(memory_split(), pid=os.getpid(), rendered=rendered)
+                os.write(write_end, (json.dumps(stats) + '\n').encode())
+                # Stay alive until every worker has measured, so pages are still shared
+                time.sleep(2)
+                os._exit(0)
+            children.append(pid)
+        os.close(write_end)
+        with os.fdopen(read_end) as results:
+            stats = [json.loads(line) for line in results]
+        for pid in children:
+            os.waitpid(pid, 0)
+        mode = 'per worker' if options['no_preload'] else 'preloaded'
+        self.stdout.write(f'Snapshot {mode}; parent RSS {parent["rss"] / 1024:.1f} MB')
+        self.stdout.write(f'{"pid":>8} {"rss MB":>8} {"pss MB":>8} {"shared MB":>10} {"private MB":>11}')
+        for row in sorted(stats, key=lambda x: x['pid']):
+            self.stdout.write(f'{row["pid"]:>8} {row["rss"] / 1024:>8.1f} {row["pss"] / 1024:>8.1f} '
+                              f'{row["shared"] / 1024:>10.1f} {row["private"] / 1024:>11.1f}')
+        total = sum(row['private'] for row in stats) / 1024
+        self.stdout.write(f'Total private across {len(stats)} workers: {total:.1f} MB')
@@ -0,0 +1,41 @@
+"""Fill the picker cache with every response for the current snapshot.
+
+    python manage.py warm_cache
+
+Run after refresh_meetings.py has written a new snapshot and before the web
+workers are restarted onto it: with a shared cache backend (file, memcached,
+redis) the workers then find every venue/region/day response already
+computed for the new version.
+"""
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Compute every picker response for the current snapshot into the picker cache.'
+    # System checks import the URL conf, which loads the snapshot before it's needed
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        from meetingpicker.apps.picker.views import (PICKER_CACHE, SNAPSHOT,
+                                                      cached_picker_data)
+        if isinstance(PICKER_CACHE, LocMemCache):
+            self.stdout.write('Picker cache is local to each process; nothing to warm.')
+            return
+        start = time.perf_counter()
+        warmed = 0
+        for venue in ('in-person', 'online'):
+            regions = cached_picker_data(venue, 'nan', 'nan')['regions']
+            warmed += 1
+            for region in regions:
+                if region == 'NONE':
+                    continue
+                days = cached_picker_data(venue, region, 'nan')['days']
+                warmed += 1
+                for day in days:
+                    cached_picker_data(venue, region, day)
+                    warmed += 1
+        self.stdout.write(f'Warmed {warmed} responses for snapshot {SNAPSHOT.version} '
+                          f'in {time.perf_counter() - start:.1f}s')
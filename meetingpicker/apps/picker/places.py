@@ -0,0 +1,118 @@
+"""Suburb and town autocomplete.
+
+Regions are too coarse for many people, who look for meetings by suburb or
+town.  Place names (Neighborhood, Town and Borough) of in-person meetings are
+gathered when the snapshot loads, folded (case, macrons and other accents,
+spacing) so "otahuhu" finds Ōtāhuhu, and put in a prefix trie.  Each trie node
+keeps the most-attended places below it, so a completion is a walk down as
+many nodes as there are characters typed.  Every word of a name is a way in:
+"eden" finds Mt Eden.
+"""
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Union
+
+import numpy as np
+from pandas import DataFrame
+
+
+PLACE_FIELDS = ('Neighborhood', 'Town', 'Borough')
+# Completions kept per trie node
+MAX_COMPLETIONS = 10
+
+
+def fold(text:str) -> str:
+    """Normalise a place name for matching: no accents, lower case, single spaces.
+
+    Args:
+        text (str): place name or typed prefix
+
+    Returns:
+        str: folded text
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+class _Node:
+    """Trie node: children by character, and the best places at or below it."""
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+
+class PlaceIndex:
+    """Places meetings are held in, by folded name, with a prefix trie over them.
+
+    Args:
+        places (DataFrame): PLACE_FIELDS columns of the meetings to index,
+            indexed by snapshot row position
+    """
+
+    def __init__(self, places:DataFrame):
+        spellings = {}
+        rows = {}
+        for field in PLACE_FIELDS:
+            if field not in places.columns:
+                continue
+            for row, value in zip(places.index, places[field].values):
+                if not isinstance(value, str) or not value.strip():
+                    continue
+                key = fold(value)
+                spellings.setdefault(key, Counter())[' '.join(value.split())] += 1
+                rows.setdefault(key, set()).add(row)
+        # Place ids in order of meeting count, most first
+        self.keys = sorted(rows, key=lambda key: (-len(rows[key]), key))
+        self.ids = {key: place for place, key in enumerate(self.keys)}
+        # The most used spelling of each place is the one shown
+        self.names = [spellings[key].most_common(1)[0][0] for key in self.keys]
+        self.rows = [np.array(sorted(rows[key]), dtype=np.int64) for key in self.keys]
+        self._root = _Node()
+        for place, key in enumerate(self.keys):
+            starts = [0] + [i + 1 for i, char in enumerate(key) if char == ' ']
+            for start in starts:
+                self._insert(key[start:], place)
+
+    def _insert(self, text:str, place:int):
+        """Add a place under every prefix of text. Places are inserted most
+        attended first, so each node's list stays in order."""
+        node = self._root
+        for char in text:
+            node = node.children.setdefault(char, _Node())
+            if len(node.top) < MAX_COMPLETIONS and place not in node.top:
+                node.top.append(place)
+
+    def complete(self, prefix:str, limit:int = MAX_COMPLETIONS) -> List[Dict[str, Union[str, int]]]:
+        """Places with a word starting with the typed text, most meetings first.
+
+        Args:
+            prefix (str): typed text
+            limit (int, optional): most places to return. Defaults to MAX_COMPLETIONS.
+
+        Returns:
+            List[Dict[str, Union[str, int]]]: key, display name and meeting count of each place
+        """
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [{'key': self.keys[place], 'place': self.names[place], 'count': len(self.rows[place])}
+                for place in node.top[:limit]]
+
+    def lookup(self, key:str) -> Union[int, None]:
+        """Place id for a key returned by ``complete`` (or any spelling of the name).
+
+        Args:
+            key (str): place key
+
+        Returns:
+            Union[int, None]: place id, None if no meetings are held there
+        """
+        return self.ids.get(fold(key))
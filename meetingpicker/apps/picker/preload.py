@@ -0,0 +1,42 @@
+"""Preloading the meeting snapshot in a pre-fork parent process.
+
+When the app server forks its workers from a process that has already built
+the snapshot, the workers share those memory pages copy-on-write.  Sharing
+only lasts while nothing writes to the pages: the snapshot keeps its data in
+flat buffers (see snapshot.py) to keep reference count updates off them, and
+``gc.freeze`` stops the cyclic garbage collector from walking (and writing
+to) everything allocated during startup.
+"""
+import gc
+from typing import Dict, Union
+
+
+def preload() -> None:
+    """Build the snapshot now and move everything allocated so far out of the
+    garbage collector's reach. Call once in the parent, before forking.
+    """
+    # Importing the views module loads the snapshot and its indexes
+    from meetingpicker.apps.picker import views  # noqa: F401
+    gc.collect()
+    gc.freeze()
+
+
+def memory_split(pid:Union[int, str] = 'self') -> Dict[str, int]:
+    """Shared versus private memory of a process, from /proc (Linux only).
+
+    Args:
+        pid (Union[int, str], optional): process id. Defaults to 'self'.
+
+    Returns:
+        Dict[str, int]: rss, pss, shared and private memory in kB
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss': fields.get('Rss', 0),
+            'pss': fields.get('Pss', 0),
+            'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+            'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)}
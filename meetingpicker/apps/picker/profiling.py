@@ -0,0 +1,140 @@
+"""On-demand profiling of single requests, for staff.
+
+With PROFILE_SECRET set, a request carrying the header
+``X-Picker-Profile: <secret>`` (or made by a logged-in staff user with
+``?profile=1``) is run under cProfile, with a stack sampler alongside, from
+the view through to the rendered response body. Picker responses are then
+computed afresh rather than served from the cache. Three files are written to
+PROFILE_DIR, named in the response's X-Picker-Profile header:
+
+- <name>.prof: pstats data, for snakeviz, gprof2dot and the like
+- <name>.txt: call tree - functions by cumulative time, and what each called
+- <name>.folded: sampled stacks in collapsed format, for flamegraph.pl or speedscope
+
+Without PROFILE_SECRET the middleware drops itself from the middleware chain
+at startup, so requests don't pass through it at all.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.crypto import constant_time_compare
+from django.utils.text import slugify
+
+
+PROFILE_HEADER = 'HTTP_X_PICKER_PROFILE'
+# Numbers this process's profiles, so none overwrites another from the same second
+PROFILE_COUNTER = itertools.count(1)
+
+
+class StackSampler:
+    """Record the call stack of one thread at a fixed interval.
+
+    Args:
+        thread_id (int): thread to sample
+        interval (float, optional): seconds between samples. Defaults to 0.001.
+    """
+
+    def __init__(self, thread_id:int, interval:float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Samples in collapsed stack format: one ``a;b;c count`` line per stack."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it with the profiling secret, or come
+    from staff. Only installed when PROFILE_SECRET is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_SECRET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def wants_profile(self, request) -> bool:
+        """Whether a request asked to be profiled, and may be."""
+        if PROFILE_HEADER in request.META:
+            return constant_time_compare(request.META[PROFILE_HEADER], settings.PROFILE_SECRET)
+        if request.GET.get('profile') == '1':
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_active and user.is_staff)
+        return False
+
+    def __call__(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        # Views skip their caches, so the profile shows the work itself
+        request.profiling = True
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+            if response.streaming:
+                # Render streamed bodies now, inside the profile
+                response.streaming_content = [b''.join(response.streaming_content)]
+        finally:
+            profiler.disable()
+            sampler.stop()
+        name = (f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(PROFILE_COUNTER)}-'
+                f'{slugify(request.path.replace("/", " ")) or "root"}')
+        write_profile(profiler, sampler, name)
+        response['X-Picker-Profile'] = name
+        return response
+
+
+def write_profile(profiler:cProfile.Profile, sampler:StackSampler, name:str,
+                  profile_dir:str = None) -> None:
+    """Save a request's profile as pstats data, a text call tree and folded stacks.
+
+    Args:
+        profiler (cProfile.Profile): finished profile
+        sampler (StackSampler): finished stack samples
+        name (str): file name, without extension
+        profile_dir (str, optional): output directory. Defaults to settings.PROFILE_DIR.
+    """
+    profile_dir = profile_dir or settings.PROFILE_DIR
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, name)
+    profiler.dump_stats(path + '.prof')
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report).strip_dirs().sort_stats('cumulative')
+    stats.print_stats(60)
+    stats.print_callees(30)
+    with open(path + '.txt', 'w') as f:
+        f.write(report.getvalue())
+    with open(path + '.folded', 'w') as f:
+        f.write(sampler.folded())
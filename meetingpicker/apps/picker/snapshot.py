@@ -0,0 +1,224 @@
+"""The meeting snapshot served by the picker.
+
+refresh_meetings.py writes data/all_meetings.csv; everything the views need
+from it (the table itself, facet bitmaps, map clusters, place names) is built
+once here when the snapshot is loaded, and tagged with a version derived from
+the file content so responses and caches can be keyed on it.
+
+The table is not kept as a DataFrame.  A DataFrame of text holds one Python
+object per cell, and every request touching those objects writes to their
+reference counts, which un-shares the memory pages of a forked web worker.
+Instead each text column is stored as a few flat buffers (see StringColumn),
+and views materialise a small DataFrame for just the rows they need.
+
+When the refresh has written a venue table (see meetingpicker.utils.venues),
+address columns are held once per venue and looked up through each meeting's
+venue, and the venue's pre-rendered Location block comes with them.
+
+A loaded snapshot is never changed.  Its arrays are marked read-only, its
+mappings are read-only proxies and its attributes can't be reassigned, so any
+number of threads can serve requests from one snapshot without locks: queries
+hand out row positions and slices of the shared arrays, and only the frames
+built by ``frame`` (which belong to the caller) are ever written to.
+"""
+from types import MappingProxyType
+from typing import Dict, List, Union
+
+import numpy as np
+from pandas import DataFrame, factorize, read_csv
+
+from meetingpicker.apps.picker.clusters import ClusterIndex
+from meetingpicker.apps.picker.facets import FacetIndex
+from meetingpicker.apps.picker.places import PLACE_FIELDS, PlaceIndex
+from meetingpicker.utils.history import file_version
+from meetingpicker.utils.venues import ADDRESS_COLS, RENDERED_COLS, VENUE_FILE, load_venues
+
+
+SNAPSHOT_FILE = 'data/all_meetings.csv'
+
+
+def read_only(array:np.ndarray) -> np.ndarray:
+    """Mark an array (and so every view of it) read-only.
+
+    Args:
+        array (np.ndarray): array to freeze
+
+    Returns:
+        np.ndarray: the same array
+    """
+    array.flags.writeable = False
+    return array
+
+
+class StringColumn:
+    """Column of text stored as flat buffers.
+
+    Distinct values are UTF-8 encoded into one bytes buffer with an offsets
+    array; each row is an integer code into them (-1 for missing values).
+
+    Args:
+        values (np.ndarray): object array of str, with NaN for missing values
+    """
+
+    def __init__(self, values:np.ndarray):
+        codes, uniques = factorize(values, use_na_sentinel=True)
+        encoded = [str(value).encode('utf-8') for value in uniques]
+        self.codes = codes.astype(np.int32)
+        self.buffer = b''.join(encoded)
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    def take(self, rows:np.ndarray) -> np.ndarray:
+        """Decode the values at some row positions.
+
+        Args:
+            rows (np.ndarray): row positions
+
+        Returns:
+            np.ndarray: object array of str, NaN for missing values
+        """
+        values = np.empty(len(rows), dtype=object)
+        for i, code in enumerate(self.codes[rows]):
+            if code < 0:
+                values[i] = np.nan
+            else:
+                values[i] = self.buffer[self.offsets[code]:self.offsets[code + 1]].decode('utf-8')
+        return values
+
+
+class Snapshot:
+    """A loaded meeting table and the indexes built over it.
+
+    Args:
+        meetings (DataFrame): meeting table, as written by refresh_meetings.py
+        version (str): content hash of the snapshot files
+        venues (DataFrame, optional): venue table the meetings' venue_id refers
+            to. Defaults to None.
+    """
+
+    def __init__(self, meetings:DataFrame, version:str, venues:DataFrame = None):
+        self.version = version
+        self.size = len(meetings)
+        self.columns = list(meetings.columns)
+        self.data = {}
+        for col in self.columns:
+            values = meetings[col].values
+            if values.dtype == object:
+                self.data[col] = StringColumn(values)
+            else:
+                self.data[col] = np.ascontiguousarray(values)
+        # Venue row of each meeting, for columns held per venue
+        self.venue_rows = None
+        self.venue_data = {}
+        if venues is not None and 'venue_id' in self.columns:
+            self._add_venues(meetings['venue_id'].values, venues)
+        self.facets = FacetIndex(meetings)
+        self.clusters = self._clusters(meetings)
+        self.places = self._places()
+        self._freeze()
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'Snapshot is read-only; cannot set {name}')
+        super().__setattr__(name, value)
+
+    def _freeze(self):
+        """Make the table and its indexes read-only, once they're built."""
+        for column in list(self.data.values()) + list(self.venue_data.values()):
+            if isinstance(column, StringColumn):
+                read_only(column.codes)
+                read_only(column.offsets)
+            else:
+                read_only(column)
+        if self.venue_rows is not None:
+            read_only(self.venue_rows)
+        for clusters in self.clusters.values():
+            for level in clusters.levels.values():
+                for values in level.values():
+                    read_only(values)
+            for tree in clusters.trees.values():
+                for values in (tree.xs, tree.ys, tree.order, tree.keys):
+                    read_only(values)
+        for rows in self.places.rows:
+            read_only(rows)
+        self.places.rows = tuple(self.places.rows)
+        self.facets.bitmaps = MappingProxyType({facet: MappingProxyType(bitmaps)
+                                                for facet, bitmaps in self.facets.bitmaps.items()})
+        self.data = MappingProxyType(self.data)
+        self.venue_data = MappingProxyType(self.venue_data)
+        self.clusters = MappingProxyType(self.clusters)
+        self.columns = tuple(self.columns)
+        self._frozen = True
+
+    def _add_venues(self, venue_ids:np.ndarray, venues:DataFrame):
+        """Look address columns up per venue instead of storing them per meeting."""
+        # Meetings whose venue is missing from the table point past its end, at no address
+        lookup = np.full(max(venue_ids.max(initial=0), venues['venue_id'].max()) + 1,
+                         len(venues), dtype=np.int32)
+        lookup[venues['venue_id'].values] = np.arange(len(venues), dtype=np.int32)
+        self.venue_rows = lookup[venue_ids]
+        for col in ADDRESS_COLS + RENDERED_COLS:
+            self.venue_data[col] = StringColumn(np.append(venues[col].values, np.nan))
+        position = self.columns.index('venue_id')
+        self.columns[position + 1:position + 1] = ADDRESS_COLS + RENDERED_COLS
+
+    def _clusters(self, meetings:DataFrame) -> Dict[str, ClusterIndex]:
+        """Map clusters per venue, over all meetings with coordinates."""
+        if not {'Longitude', 'Latitude'}.issubset(meetings.columns):
+            # Snapshot from before coordinates were kept
+            return {}
+        clusters = {}
+        for venue in ('in-person', 'online'):
+            rows = self.facets.rows(self.facets.bitmaps['venue'][venue])
+            clusters[venue] = ClusterIndex(meetings['Longitude'].values[rows],
+                                           meetings['Latitude'].values[rows],
+                                           rows=rows)
+        return clusters
+
+    def _places(self) -> PlaceIndex:
+        """Autocomplete index over the suburbs and towns of in-person meetings."""
+        rows = self.facets.rows(self.facets.bitmaps['venue']['in-person'])
+        return PlaceIndex(self.frame(rows, columns=[col for col in PLACE_FIELDS if col in self.columns]))
+
+    def frame(self, rows:Union[np.ndarray, List[int]] = None,
+              columns:List[str] = None) -> DataFrame:
+        """Materialise some rows of the table as a new DataFrame.
+
+        The result has the same columns and dtypes as the snapshot file read
+        with ``read_csv`` (plus, with a venue table, each meeting's venue 
+        columns as text), indexed by row position, and belongs to the caller.
+
+        Args:
+            rows (Union[np.ndarray, List[int]], optional): row positions. Defaults to all rows.
+            columns (List[str], optional): columns to include. Defaults to all columns.
+
+        Returns:
+            DataFrame: selected meetings
+        """
+        rows = np.arange(self.size) if rows is None else np.asarray(rows, dtype=np.int64)
+        data = {}
+        columns = list(columns or self.columns)
+        for col in columns:
+            if col in self.venue_data:
+                data[col] = self.venue_data[col].take(self.venue_rows[rows])
+                continue
+            column = self.data[col]
+            data[col] = column.take(rows) if isinstance(column, StringColumn) else column[rows]
+        return DataFrame(data, index=rows, columns=columns)
+
+
+def load_snapshot(path:str = SNAPSHOT_FILE, venues_path:str = VENUE_FILE) -> Snapshot:
+    """Read the snapshot files and build their indexes.
+
+    Args:
+        path (str, optional): snapshot CSV. Defaults to SNAPSHOT_FILE.
+        venues_path (str, optional): venue CSV. Defaults to VENUE_FILE.
+
+    Returns:
+        Snapshot: loaded snapshot
+    """
+    meetings = read_csv(path)
+    if 'venue_id' not in meetings.columns:
+        # Written before addresses were split out into venues
+        return Snapshot(meetings, file_version(path))
+    return Snapshot(meetings, file_version(path, venues_path), load_venues(venues_path))
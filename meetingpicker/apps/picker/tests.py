@@ -1,3 +1,187 @@
-from django.test import TestCase
+import os
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+import geopandas as gp
+import pandas as pd
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+import refresh_meetings
+from meetingpicker.apps.picker.facets import FacetIndex
+from meetingpicker.apps.picker.loadtest import synthetic_meetings, write_synthetic_snapshot
+from meetingpicker.utils.ical import build_feeds, feed_path
+
+
+# The views load the snapshot in the working directory when first imported, so
+# they're imported from a scratch directory holding a synthetic one
+with tempfile.TemporaryDirectory(prefix='picker-test-') as directory:
+    write_synthetic_snapshot(directory, 400)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        from meetingpicker.apps.picker import views
+    finally:
+        os.chdir(cwd)
+
+
+class PickerCacheTests(SimpleTestCase):
+    """Picker responses are cached under the decoded region, whatever the
+    spelling in the URI."""
+
+    # The page's spelling of each region (see sendRegion in base.html)
+    PAGE_SPELLINGS = {'Auckland': 'Auckland',
+                      'Christchurch and Canterbury': 'Christchurch_and Canterbury',
+                      "Hawke's Bay and Gisborne": 'Hawke__s_Bay and Gisborne'}
+
+    def test_spellings_share_a_key(self):
+        for region, page in self.PAGE_SPELLINGS.items():
+            for day in ('nan', 'SHOW ALL', 'MONDAY'):
+                self.assertEqual(views.picker_cache_key('in-person', page, day),
+                                 views.picker_cache_key('in-person', region, day))
+
+    def test_warmed_responses_are_hit_by_the_page(self):
+        with tempfile.TemporaryDirectory(prefix='picker-cache-') as location, \
+                mock.patch.object(views, 'PICKER_CACHE', FileBasedCache(location, {})):
+            call_command('warm_cache', stdout=StringIO())
+            with mock.patch.object(views, 'picker_data',
+                                   side_effect=AssertionError('picker cache miss')) as picker_data:
+                regions = self.client.get('/in-person/nan/nan/').json()['regions']
+                for region in regions[1:]:
+                    page = region.replace(' ', '_', 1).replace("'", '__', 1)
+                    url = f'/in-person/{quote(page)}'
+                    days = self.client.get(f'{url}/nan/').json()['days']
+                    for day in days:
+                        response = self.client.get(f'{url}/{quote(day)}/')
+                        self.assertEqual(response.status_code, 200)
+                picker_data.assert_not_called()
+
+
+class FacetTests(SimpleTestCase):
+    """Facet filters and counts from the bitmap index."""
+
+    def setUp(self):
+        self.index = FacetIndex(pd.DataFrame(
+            [('in-person', 'Auckland', 'MONDAY', 'Open, Speaker', '7:00 AM'),
+             ('hybrid', 'Auckland', 'TUESDAY', 'Open', '12:00 PM'),
+             ('online', 'Wellington', 'MONDAY', 'Closed, Speaker', '6:00 PM'),
+             ('in-person', 'Wellington', 'MONDAY', '', '11:59 AM'),
+             ('online', 'Christchurch and Canterbury', 'SUNDAY', 'Open, Speaker', '5:59 PM')],
+            columns=['venue', 'region', 'Day', 'Formats', 'Start Time']))
+
+    def rows(self, filters):
+        return self.index.rows(self.index.match(filters)).tolist()
+
+    def test_hybrid_meetings_are_in_person_and_online(self):
+        self.assertEqual(self.rows({'venue': ['in-person']}), [0, 1, 3])
+        self.assertEqual(self.rows({'venue': ['online']}), [1, 2, 4])
+        self.assertEqual(self.rows({'venue': ['hybrid']}), [1])
+
+    def test_regions_widen(self):
+        self.assertEqual(self.rows({'region': ['Auckland', 'Wellington']}), [0, 1, 2, 3])
+        self.assertEqual(self.rows({'region': ['Auckland'], 'day': ['MONDAY', 'SUNDAY']}), [0])
+
+    def test_formats_narrow(self):
+        self.assertEqual(self.rows({'format': ['Open']}), [0, 1, 4])
+        self.assertEqual(self.rows({'format': ['Open', 'Speaker']}), [0, 4])
+        self.assertEqual(self.rows({'format': ['Open', 'Closed']}), [])
+        self.assertEqual(self.rows({'format': [], 'region': ['Wellington']}), [2, 3])
+
+    def test_time_buckets(self):
+        self.assertEqual(self.rows({'time': ['morning']}), [0, 3])
+        self.assertEqual(self.rows({'time': ['afternoon']}), [1, 4])
+        self.assertEqual(self.rows({'time': ['evening']}), [2])
+
+    def test_counts_leave_out_a_widening_facets_own_selection(self):
+        counts = self.index.counts({'region': ['Auckland'], 'format': ['Open']})
+        # Regions are counted against the format selection alone
+        self.assertEqual(counts['region'], {'Auckland': 2, 'Wellington': 0,
+                                            'Christchurch and Canterbury': 1})
+        # Formats narrow, so they're counted against the full selection
+        self.assertEqual(counts['format'], {'Open': 2, 'Speaker': 1, 'Closed': 0})
+        self.assertEqual(counts['day'], {'MONDAY': 1, 'TUESDAY': 1, 'SUNDAY': 0})
+        self.assertEqual(counts['venue'], {'in-person': 2, 'online': 1, 'hybrid': 1})
+
+    def test_unknown_facet(self):
+        with self.assertRaises(ValueError):
+            self.index.match({'town': ['Ponsonby']})
+
+
+class FeedTests(SimpleTestCase):
+    """Calendar feeds built from the snapshot."""
+
+    def test_meeting_in_two_regions_is_one_event(self):
+        meetings = synthetic_meetings(40)
+        meetings = meetings.loc[meetings['venue'] == 'in-person']
+        # A meeting inside two overlapping region shapes has a row for each
+        other = 'Auckland' if meetings.iloc[0]['region'] == 'Wellington' else 'Wellington'
+        overlap = meetings.iloc[[0]].assign(region=other)
+        meetings = pd.concat([meetings, overlap], ignore_index=True)
+        feeds = build_feeds(meetings)
+        for path, (name, events) in feeds.items():
+            uids = [event[0] for event in events]
+            self.assertEqual(len(uids), len(set(uids)), path)
+        uid = f'UID:meeting-{int(overlap.iloc[0]["id_bigint"])}@'
+        for region in meetings.iloc[[0, -1]]['region']:
+            events = feeds[feed_path('in-person', region)][1]
+            self.assertEqual(sum(event[0].startswith(uid) for event in events), 1)
+        self.assertEqual(len(feeds[feed_path('in-person')][1]), len(meetings) - 1)
+
+
+class RefreshTests(SimpleTestCase):
+    """The refresh's transform and join stages, run on a saved extract."""
+
+    # Meeting fields every BMLT extract has, whether or not a meeting sets them
+    PROMPTS = ['Meeting Name', 'Virtual Meeting Link', 'Virtual Meeting Additional Info',
+               'Phone Meeting Dial-in Number', 'Location Name', 'Street Address',
+               'Neighborhood', 'Town', 'Borough', 'County', 'Zip Code', 'Nation',
+               'Additional Location Information', 'Comments', 'Bus Lines',
+               'Train Lines', 'Contact 1 Email']
+
+    def extract(self):
+        """A small extract, laid out as ``refresh_meetings.extract`` returns it:
+        an in-person meeting in Auckland, an online one in Wellington, a hybrid
+        one in Christchurch and one in Sydney, which isn't local."""
+        meetings = [(1, 'Ponsonby', '1 Ponsonby Rd', '', 1, '19:00:00', '1,2', 174.76, -36.85),
+                    (2, 'Te Aro', '', 'https://zoom.us/j/2', 0, '07:30:00', '', 174.78, -41.29),
+                    (3, 'Riccarton', '3 Riccarton Rd', 'https://zoom.us/j/3', 6, '12:00:00', '3',
+                     172.63, -43.53),
+                    (4, 'Sydney', '4 George St', '', 3, '18:00:00', '', 151.21, -33.87)]
+        data = []
+        main = []
+        for meeting_id, name, address, link, weekday, start, formats, lon, lat in meetings:
+            fields = dict.fromkeys(self.PROMPTS, '')
+            fields.update({'Meeting Name': name, 'Street Address': address,
+                           'Virtual Meeting Link': link})
+            data += [(meeting_id, prompt, value, None, None) for prompt, value in fields.items()]
+            main.append((meeting_id, weekday, pd.Timedelta(start), pd.Timedelta('01:30:00'),
+                         formats, lon, lat))
+        columns = ['id_bigint', 'field_prompt', 'data_string', 'data_bigint', 'data_double']
+        return {'meeting_data': pd.DataFrame(data, columns=columns),
+                'meeting_main': pd.DataFrame(main, columns=['id_bigint', 'weekday_tinyint',
+                                                            'start_time', 'duration_time',
+                                                            'formats', 'longitude', 'latitude']),
+                'meeting_formats': pd.DataFrame({'shared_id_bigint': [1, 2, 3],
+                                                 'name_string': ['Open', 'Closed', 'Speaker']})}
+
+    def test_extract_to_snapshot(self):
+        with tempfile.TemporaryDirectory(prefix='picker-extract-') as extract_dir:
+            refresh_meetings.save_extract(self.extract(), extract_dir)
+            with redirect_stdout(StringIO()):
+                raw = refresh_meetings.load_extract(extract_dir)
+        meetings = refresh_meetings.get_meeting_data(raw)
+        meetings = refresh_meetings.join_regions(meetings, gp.read_file(refresh_meetings.REGION_FILE))
+        meetings = meetings.set_index('Meeting Name')
+        self.assertEqual(sorted(meetings.index), ['Ponsonby', 'Riccarton', 'Te Aro'])
+        columns = ['region', 'venue', 'Day', 'Start Time', 'Duration', 'Formats']
+        self.assertEqual(meetings.loc['Ponsonby', columns].tolist(),
+                         ['Auckland', 'in-person', 'MONDAY', '7:00 PM', '1:30', 'Open, Closed'])
+        self.assertEqual(meetings.loc['Te Aro', columns].tolist(),
+                         ['Wellington', 'online', 'SUNDAY', '7:30 AM', '1:30', ''])
+        self.assertEqual(meetings.loc['Riccarton', columns].tolist(),
+                         ['Christchurch and Canterbury', 'hybrid', 'SATURDAY', '12:00 PM', '1:30',
+                          'Speaker'])
@@ -1,9 +1,22 @@
 from django.urls import path, re_path, include
 
-from .views import picker
+from .views import (changes, feed, map_points, map_regions, picker, picker_rows, picker_stream,
+                    place_meetings, places, schedule, search, service_worker, snapshot_manifest)
 
 app_name = 'na_picker'
 
 urlpatterns = [
+        path('search/', search, name='search'),
+        path('changes/', changes, name='changes'),
+        path('places/', places, name='places'),
+        path('places/<str:key>/', place_meetings, name='place_meetings'),
+        path('snapshot.json', snapshot_manifest, name='snapshot_manifest'),
+        path('sw.js', service_worker, name='service_worker'),
+        path('map/regions/<int:z>.geojson', map_regions, name='map_regions'),
+        path('map/<str:venue>/<int:z>/<int:x>/<int:y>.geojson', map_points, name='map_points'),
+        re_path(r'^feeds/(?P<path>[\w\-/]+)\.ics$', feed, name='feed'),
+        re_path(r'^schedules/(?P<name>[\w\-]+)\.(?P<ext>html|pdf)$', schedule, name='schedule'),
         path('<str:venue>/<str:region>/<str:day>/', picker, name='picker'),
+        path('<str:venue>/<str:region>/<str:day>/rows/', picker_rows, name='picker_rows'),
+        path('<str:venue>/<str:region>/<str:day>/stream/', picker_stream, name='picker_stream'),
 ]
@@ -1,30 +1,66 @@
-import calendar
+import os
+from functools import lru_cache
+from urllib.parse import quote
 from pandas import (DataFrame,
 					Series,
-					read_csv,
 					)
 from pandas import options as pandas_options
-from datetime import datetime
+from numpy import ndarray
+from datetime import datetime, timezone
 from requests import request
-from typing import List, Union
+from typing import Iterator, List, Tuple, Union
 
-from django.http import HttpResponse, JsonResponse
+from django.core.cache import caches
+from django.http import (FileResponse, Http404, HttpResponse, JsonResponse, 
+						 StreamingHttpResponse)
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
 from django.views.generic import ListView
 from dotenv import load_dotenv, find_dotenv
 
+from meetingpicker.apps.picker.clusters import tile_bbox
+from meetingpicker.apps.picker.coalesce import SingleFlight
+from meetingpicker.apps.picker.facets import FACETS
 from meetingpicker.apps.picker.models import PickerModel
+from meetingpicker.apps.picker.snapshot import Snapshot, load_snapshot
+from meetingpicker.utils.history import changes_since, latest_rows, load_versions
+from meetingpicker.utils.venues import location_parts
+from meetingpicker.utils.ical import FEED_DIR, MANIFEST, load_manifest
+from meetingpicker.utils.schedules import SCHEDULE_DIR
+from meetingpicker.utils.maps import region_layer_path
 
 
 #Filter pandas warning about using a mysql connection directly
 from warnings import filterwarnings
 filterwarnings('ignore', category=UserWarning)
 pandas_options.mode.copy_on_write = True
+# to_html lifts the column width limit with a process-wide option_context while
+# it renders; with the limit already off, tables rendered in parallel threads
+# can't see each other's setting and cut cells short
+pandas_options.display.max_colwidth = None
 
 #Load environment variables from file (db connection parameters)
 load_dotenv(find_dotenv('../.env'), override=True)
 
-ALL_MEETINGS = read_csv('data/all_meetings.csv')
+SNAPSHOT = load_snapshot()
+FACET_INDEX = SNAPSHOT.facets
+# Concurrent identical picker requests wait (up to 10s) on one computation
+COALESCER = SingleFlight(timeout=10)
+# Computed picker responses, shared between workers unless it's a local memory cache
+PICKER_CACHE = caches['picker']
+# Calendar feed manifest, re-read only when the refresh step rewrites it
+FEED_MANIFEST = {'mtime': None, 'entries': {}}
+# Calendar clients poll feeds; let them (and any proxy) keep a copy between refreshes
+FEED_MAX_AGE = 900
+MAP_MAX_AGE = 900
+MAP_POINT_COLS = ['id_bigint', 'Meeting Name', 'Day', 'Start Time', 'region', 'venue']
+# Meeting tables by the page (JSON) or streamed (HTML), a chunk of rows at a time
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK = 200
+TABLE_HTML = {'classes': 'table table-striped table-bordered table-hover', 'table_id': 'mtgs',
+			  'index': False, 'escape': False, 'render_links': True}
 DAYS = {0: 'MONDAY',
 		1: 'TUESDAY',
 		2: 'WEDNESDAY',
@@ -32,15 +68,6 @@ DAYS = {0: 'MONDAY',
 		4: 'FRIDAY',
 		5: 'SATURDAY',
 		6: 'SUNDAY'}
-# Rules for sorting tables 
-today = datetime.today()
-weekday = calendar.weekday(today.year, today.month, today.day) 
-start_list = list(range(weekday, 7, 1))
-end_list = list(range(0, weekday))
-day_list = start_list + end_list 
-day_names = [DAYS[i] for i in day_list]
-day_list = [*range(7)]
-DAYS_ORDERED = {i:j for i, j in zip(day_names, day_list)}
 REGION_ORDERED = {"Auckland" : 1,
 				"Christchurch and Canterbury" : 2,
 				"Dunedin, Otago and Southland" : 3,
@@ -62,20 +89,48 @@ class ProcessingError(Exception):
 	 pass  
 
 
-def format_table(mtgs:DataFrame) -> str:
-	"""Take table of meetings and format for display.
+def ordered_days() -> List[str]:
+	"""Day names in the order tables list them: today first, then the rest
+	of the week. Worked out on each call, so long-running processes (and the
+	refresh daemon) move on at midnight.
+
+	Returns:
+		List[str]: day names, starting with today
+	"""
+	weekday = datetime.today().weekday()
+	return [DAYS[(weekday + i) % 7] for i in range(7)]
+
+
+def use_snapshot(snapshot:Snapshot) -> None:
+	"""Compute responses from another snapshot from now on. For the refresh
+	daemon, which serves no requests, to warm the cache for each snapshot it
+	publishes; web workers load the new snapshot when they restart.
+
+	Args:
+		snapshot (Snapshot): newly loaded snapshot
+	"""
+	global SNAPSHOT, FACET_INDEX
+	SNAPSHOT, FACET_INDEX = snapshot, snapshot.facets
+
+
+def display_columns(mtgs:DataFrame) -> DataFrame:
+	"""Build the columns shown in the meetings table, in the order given.
+	The frame passed in is left as it is.
 
 	Args:
 		mtgs (DataFrame): DataFrame of meetings
 
 	Returns:
-		DataFrame: table for display
+		DataFrame: Day, Meeting Name, Virtual, Location, Start Time, Duration 
+		and Formats as text
 	"""
-	mtgs.fillna('', inplace=True)
-	for col in mtgs:
-		mtgs[col] = mtgs[col].astype(str)
+	if 'Transport' not in mtgs:
+		# Snapshot without a venue table - render each meeting's venue here
+		parts = [location_parts(row) for _, row in mtgs.iterrows()]
+		mtgs = mtgs.assign(Location=[location for location, _ in parts],
+						   Transport=[transport for _, transport in parts])
+	mtgs = mtgs.fillna('').astype(str)
 	mtgs['Virtual'] = ''
-	mtgs['Location'] = ''
 	if not len(mtgs) == 0:
 		mtgs['Virtual'] = mtgs.apply(lambda x: '<br>'.join(filter(None, [
 				'<a href="' + 
@@ -88,36 +143,63 @@ def format_table(mtgs:DataFrame) -> str:
 				x['Virtual Meeting Additional Info'] if not \
 					x['Virtual Meeting Additional Info'] == '' else None])), axis=1)
 		mtgs['Virtual'] = mtgs['Virtual'].apply(lambda x: x.replace('<a href="">Click to Join Meeting</a>', ''))
-		# Create cleaned location column for display purposes
+		# Venue's pre-rendered location block, with the meeting's comments
 		mtgs['Location'] = mtgs.apply(lambda x: '<br>'.join(filter(None, [
-				x['Location Name'].strip() if not x['Location Name'].strip() == '' else None,
-				x['Street Address'].strip() if not x['Street Address'].strip() == '' else None,
-				', '.join(filter(None, [  # Filter out empty strings
-					x['Neighborhood'].strip() if not x['Neighborhood'].strip() == '' else None,
-					x['Town'].strip() if not x['Town'].strip() == '' else None,
-					x['Borough'].strip() if not x['Borough'].strip() == '' else None,
-					x['County'].strip() if not x['County'].strip() == '' else None,
-					x['Zip Code'].strip() if not x['Zip Code'].strip() == '' else None,
-					x['Nation'].strip() if not x['Nation'].strip() == '' else None])),
-				x['Additional Location Information'].strip() if not \
-					x['Additional Location Information'].strip() == '' else None,
+				x['Location'],
 				x['Comments'].strip() if not x['Comments'].strip() == '' else None,
-				x['Bus Lines'].strip() if not x['Bus Lines'].strip() == '' else None,
-				x['Train Lines'].strip() if not x['Train Lines'].strip() == '' else None])
+				x['Transport']])
 				), axis=1)
 	# Limit columns to "for display" only
-	mtgs = mtgs[['Day', 'Meeting Name', 'Virtual', 'Location', 
+	return mtgs[['Day', 'Meeting Name', 'Virtual', 'Location', 
 	      		 'Start Time', 'Duration', 'Formats']]
-	# Re-sort by day, then seconds into each day (for time)
-	mtgs['Ordering'] = mtgs.apply(lambda x: str(DAYS_ORDERED.get(x['Day'], 9999)) + \
-								 	str( int( (datetime.strptime(x['Start Time'], '%I:%M %p')\
-									- datetime(1900,1,1)).total_seconds() ) ), axis=1)
-	mtgs.sort_values(by='Ordering', inplace=True)
-	mtgs.drop('Ordering', axis=1, inplace=True)
+
+
+def meeting_ordering(mtgs:DataFrame) -> Series:
+	"""Display order of meetings: by day (starting today), then seconds into each day.
+
+	Args:
+		mtgs (DataFrame): meetings, with Day and Start Time columns
+
+	Returns:
+		Series: sort key for each meeting
+	"""
+	days_ordered = {day: i for i, day in enumerate(ordered_days())}
+	return mtgs.apply(lambda x: str(days_ordered.get(x['Day'], 9999)) + \
+					  str( int( (datetime.strptime(x['Start Time'], '%I:%M %p')\
+					  - datetime(1900,1,1)).total_seconds() ) ), axis=1)
+
+
+def format_table(mtgs:DataFrame) -> str:
+	"""Take table of meetings and format for display.
+
+	Args:
+		mtgs (DataFrame): DataFrame of meetings
+
+	Returns:
+		DataFrame: table for display
+	"""
+	mtgs = display_columns(mtgs)
+	# Re-sort by day, then seconds into each day (for time); stable, so
+	# meetings at the same time keep the order rows/ and stream/ give them
+	mtgs = mtgs.assign(Ordering=meeting_ordering(mtgs)).sort_values(by='Ordering', kind='stable')\
+			   .drop(columns='Ordering')
 	#Format Table as HTML table for display
-	mtgs = mtgs.to_html(classes='table table-striped table-bordered table-hover', table_id='mtgs',
-		     			index=False, escape=False, render_links=True)	
-	return mtgs
+	return mtgs.to_html(**TABLE_HTML)
+
+
+def split_table(html:str) -> Tuple[str, str, str]:
+	"""Split an HTML table from ``format_table`` into its opening (through 
+	``<tbody>``), body rows and closing, so tables can be joined up.
+
+	Args:
+		html (str): HTML table
+
+	Returns:
+		Tuple[str, str, str]: head, rows, foot
+	"""
+	head, rest = html.split('<tbody>\n', 1)
+	rows, foot = rest.rsplit('  </tbody>', 1)
+	return head + '<tbody>\n', rows, '  </tbody>' + foot
 
 	
 def sort_on_day(series:Series) -> Series:
@@ -129,7 +211,8 @@ def sort_on_day(series:Series) -> Series:
 	Returns:
 		Series: Pandas series, sorted
 	"""
-	return series.apply(lambda x: DAYS_ORDERED.get(x, 9999))
+	days_ordered = {day: i for i, day in enumerate(ordered_days())}
+	return series.apply(lambda x: days_ordered.get(x, 9999))
 
 
 def sort_on_region(series:Series) -> Series:
@@ -144,6 +227,95 @@ def sort_on_region(series:Series) -> Series:
 	return series.apply(lambda x: REGION_ORDERED.get(x, 9999))
 
 
+def region_name(region:str) -> str:
+	"""Region name from its spelling in a URI. The page sends regions with
+	"_" for the first space and "__" for the first apostrophe (see sendRegion
+	in base.html); plain names pass through unchanged.
+
+	Args:
+		region (str): region from the URI
+
+	Returns:
+		str: region name
+	"""
+	return region.replace('__', "'").replace('_', ' ')
+
+
+def venue_rows(venue:str, region:str = None, day:str = None) -> ndarray:
+	"""Row positions in the snapshot for a venue, optionally narrowed to a 
+	region and/or day. Hybrid meetings count as both in-person and online.
+
+	Args:
+		venue (str): 'in-person' or 'online'
+		region (str, optional): region name. Defaults to None (all regions).
+		day (str, optional): day name. Defaults to None (all days).
+
+	Returns:
+		ndarray: ascending row positions
+	"""
+	if venue not in ('in-person', 'online'):
+		raise ValueError('Invalid venue parameter')
+	filters = {'venue': [venue]}
+	if region is not None:
+		filters['region'] = [region]
+	if day is not None:
+		filters['day'] = [day]
+	return FACET_INDEX.rows(FACET_INDEX.match(filters))
+
+
+def day_rows(venue:str, region:str, day:str) -> ndarray:
+	"""Row positions for the last step of the click path (a meeting table).
+
+	Args:
+		venue (str): 'in-person' or 'online'
+		region (str): region from the URI, or 'SHOW ALL'
+		day (str): day name, or 'SHOW ALL'
+
+	Returns:
+		ndarray: ascending row positions
+	"""
+	this_region = region_name(region)
+	this_day = None if day == 'SHOW ALL' else day
+	if region == 'SHOW ALL':
+		#Filter to just meetings on a given day
+		return venue_rows(venue, day=this_day)
+	if venue == 'online' and this_day is None:
+		# Online meetings are listed for every region
+		return venue_rows('online')
+	#Filter to just meetings in the region
+	return venue_rows(venue, region=this_region, day=this_day)
+
+
+def ordered_day_rows(venue:str, region:str, day:str, version:str) -> ndarray:
+	"""Row positions for a meeting table, in display order.
+
+	Only the day and start time of each meeting are read to order them, so
+	pages of even the longest table can be cut without building all of it.
+
+	Args:
+		venue (str): 'in-person' or 'online'
+		region (str): region from the URI, or 'SHOW ALL'
+		day (str): day name, or 'SHOW ALL'
+		version (str): snapshot version, so a new snapshot gets new entries
+
+	Returns:
+		ndarray: read-only row positions
+	"""
+	return _ordered_day_rows(venue, region, day, version, ordered_days()[0])
+
+
+@lru_cache(maxsize=64)
+def _ordered_day_rows(venue:str, region:str, day:str, version:str, today:str) -> ndarray:
+	"""``ordered_day_rows``, cached per snapshot version and per day the
+	ordering starts from."""
+	rows = day_rows(venue, region, day)
+	if len(rows):
+		ordering = meeting_ordering(SNAPSHOT.frame(rows, columns=['Day', 'Start Time']))
+		rows = rows[ordering.values.argsort(kind='stable')]
+	rows.flags.writeable = False
+	return rows
+
+
 def get_data(parameter:str = None,
 		     previous_parameters:Union[dict, str, int] = {}) -> Union[list, DataFrame]:
 	"""
@@ -160,89 +332,130 @@ def get_data(parameter:str = None,
 	DataFrame: table of meeting information 
 	
 	"""
-	# Create database conn and pull meeting data 
+	# Select rows from the snapshot's facet index, then build a frame of just those rows
 	if parameter == 'venue':
 		if previous_parameters['venue'] == 'in-person':
 			#Filter to just in-person meetings
-			meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['in-person', 'hybrid'])]
-			if len(meetings) == 0:
+			rows = venue_rows('in-person')
+			if len(rows) == 0:
 				return ['NONE']
-			meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-			regions = meetings.groupby('region').count().reset_index()\
-			                  .sort_values(by='region', key=sort_on_region)
-			return ['SHOW ALL'] + regions.region.values.tolist()
 		elif previous_parameters['venue'] == 'online':
 			#Filter to just online meetings
-			meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['online', 'hybrid'])]
-			meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-			regions = meetings.groupby('region').count().reset_index()\
-			                  .sort_values(by='region', key=sort_on_region)
-			return ['SHOW ALL'] + regions.region.values.tolist()
+			rows = venue_rows('online')
 		else:
 			raise ValueError('Invalid venue parameter')
+		meetings = SNAPSHOT.frame(rows, columns=['region'])
+		regions = meetings.groupby('region').count().reset_index()\
+		                  .sort_values(by='region', key=sort_on_region)
+		return ['SHOW ALL'] + regions.region.values.tolist()
 	elif parameter == 'region':
-		this_region = previous_parameters['region'].replace('__', "'")\
-												   .replace('_', ' ')
+		this_region = region_name(previous_parameters['region'])
 		if previous_parameters['venue'] == 'in-person':
 			#Filter to just meetings in the region
 			if previous_parameters['region'] == 'SHOW ALL':
-				meetings = ALL_MEETINGS
+				rows = None
 			else:
-				meetings = ALL_MEETINGS.loc[ALL_MEETINGS['region'] == this_region]
-			meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-			days = meetings.Day.unique().tolist()
-			return ['SHOW ALL'] + days
+				rows = FACET_INDEX.rows(FACET_INDEX.match({'region': [this_region]}))
 		elif previous_parameters['venue'] == 'online':
-			meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['online', 'hybrid'])]
-			meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-			days = meetings.Day.unique().tolist()
-			return ['SHOW ALL'] + days
+			rows = venue_rows('online')
 		else:
 			raise ValueError('Invalid venue parameter')
+		meetings = SNAPSHOT.frame(rows, columns=['Day'])
+		meetings = meetings.sort_values(by='Day', key=sort_on_day)
+		days = meetings.Day.unique().tolist()
+		return ['SHOW ALL'] + days
 	elif parameter == 'day':
-		this_region = previous_parameters['region'].replace('__', "'")\
-												   .replace('_', ' ')
+		meetings = SNAPSHOT.frame(day_rows(previous_parameters['venue'], 
+										   previous_parameters['region'],
+										   previous_parameters['day']))
 		if previous_parameters['region'] == 'SHOW ALL':
-			if previous_parameters['venue'] == 'online':
-				meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['online', 'hybrid'])]
-			elif previous_parameters['venue'] == 'in-person':
-				meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['in-person', 'hybrid'])]
-			else:
-				raise ValueError('Invalid venue parameter')
-			#Filter to just meetings on a given day
-			if not previous_parameters['day'] == 'SHOW ALL':
-				meetings = meetings.loc[meetings['Day'] == previous_parameters['day']]
-			#meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
 			return meetings
-		else:
-			if previous_parameters['day'] == 'SHOW ALL':
-				if previous_parameters['venue'] == 'online':
-					meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['online', 'hybrid'])]
-				elif previous_parameters['venue'] == 'in-person':
-					meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['in-person', 'hybrid'])]
-					meetings = meetings.loc[meetings.region == this_region]
-				else:
-					raise ValueError('Invalid venue parameter')
-				meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-				return meetings
-			else:
-				if previous_parameters['venue'] == 'online':
-					meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['online', 'hybrid'])]
-				elif previous_parameters['venue'] == 'in-person':
-					meetings = ALL_MEETINGS.loc[ALL_MEETINGS['venue'].isin(['in-person', 'hybrid'])]
-				else:
-					raise ValueError('Invalid venue parameter')
-				#Filter to just meetings in the region
-				meetings = meetings.loc[meetings['Day'] == previous_parameters['day']]
-				#Filter to just meetings in the region
-				meetings = meetings.loc[meetings.region == this_region]
-				meetings.sort_values(by='Day', key=sort_on_day, inplace=True)
-				return meetings
+		return meetings.sort_values(by='Day', key=sort_on_day, kind='stable')
 	else:
 		raise ProcessingError(f"Invalid parameter: {parameter}")
 	
 
 
+def picker_data(venue:str, region:str, day:str) -> dict:
+	"""Work out the response to one step of the venue -> region -> day click path.
+
+	Args:
+		venue (str): venue from the URI
+		region (str): region from the URI, 'nan' if not chosen yet
+		day (str): day from the URI, 'nan' if not chosen yet
+
+	Returns:
+		dict: regions, days or (rendered) meetings to return as JSON
+	"""
+	# Get data passed through URI
+	if venue == 'in-person' and region == 'nan':
+		regions = get_data(parameter='venue', 
+						   previous_parameters={'venue':'in-person'},
+						  )
+		return {'regions':regions}
+	elif venue == 'online' and region == 'nan':
+		regions = get_data(parameter='venue', 
+	      				   previous_parameters={'venue':'online'},
+						   )
+		return {'regions':regions}
+	elif region != 'nan' and day == 'nan':
+		days = get_data(parameter='region', 
+							previous_parameters={'venue':venue,
+												'region':region}
+							)
+		return {'days':days}
+	elif day != 'nan':
+		meetings = get_data(parameter='day', 
+							previous_parameters={'venue':venue,
+												'region':region,
+												'day':day}
+							)
+		if len(meetings) == 0:
+			return {'meetings':'NO MEETINGS'}
+		else:
+			# Pass pretty and cleaned html table
+			return {'meetings':format_table(meetings)}
+	else:
+		raise ProcessingError(f"Invalid request: {venue}/{region}/{day}")
+
+
+def picker_cache_key(venue:str, region:str, day:str) -> str:
+	"""Cache key for a step of the click path. The region is decoded, so the
+	page's spelling and the plain name (used by the warm_cache command and the
+	service worker's prefetch) share an entry. Tables are ordered starting
+	from today, so today is part of the key; the snapshot version is passed
+	to the cache as the key version.
+
+	Args:
+		venue (str): venue from the URI
+		region (str): region from the URI
+		day (str): day from the URI
+
+	Returns:
+		str: cache key, safe for memcached
+	"""
+	return quote(f'{venue}/{region_name(region)}/{day}/{ordered_days()[0]}', safe='/')
+
+
+def cached_picker_data(venue:str, region:str, day:str) -> dict:
+	"""``picker_data`` through the picker cache, for the loaded snapshot version.
+
+	Args:
+		venue (str): venue from the URI
+		region (str): region from the URI, 'nan' if not chosen yet
+		day (str): day from the URI, 'nan' if not chosen yet
+
+	Returns:
+		dict: regions, days or (rendered) meetings to return as JSON
+	"""
+	key = picker_cache_key(venue, region, day)
+	data = PICKER_CACHE.get(key, version=SNAPSHOT.version)
+	if data is None:
+		data = picker_data(venue, region, day)
+		PICKER_CACHE.set(key, data, version=SNAPSHOT.version)
+	return data
+
+
 class Picker(ListView):
 	"""View for meeting picker. 
 	
@@ -257,13 +470,7 @@ class Picker(ListView):
 		"""
 		self.object_list = super().get_queryset()
 		context = super(Picker, self).get_context_data(**kwargs)
-		today = datetime.today()
-		weekday = calendar.weekday(today.year, today.month, today.day)
-		start_list = list(range(weekday, 7, 1))
-		end_list = list(range(0, weekday))
-		day_list = start_list + end_list 
-		day_list = ['SHOW ALL'] + [DAYS[i] for i in day_list]
-		context['days'] = day_list
+		context['days'] = ['SHOW ALL'] + ordered_days()
 		return context
 	
 
@@ -288,38 +495,445 @@ class Picker(ListView):
 		# Identify type of request
 		if request.method != 'GET' or self.kwargs['venue'] == 'nan':
 			return render(request, self.template_name, context=self.get_context_data())
-		# Get data passed through URI
-		if self.kwargs['venue'] == 'in-person' and self.kwargs['region'] == 'nan':
-			regions = get_data(parameter='venue', 
-							   previous_parameters={'venue':'in-person'},
-							  )
-			return JsonResponse({'regions':regions})
-		elif self.kwargs['venue'] == 'online' and self.kwargs['region'] == 'nan':
-			regions = get_data(parameter='venue', 
-		      				   previous_parameters={'venue':'online'},
-							   )
-			return JsonResponse({'regions':regions})
-		elif kwargs['region'] != 'nan' and kwargs['day'] == 'nan':
-			days = get_data(parameter='region', 
-								previous_parameters={'venue':self.kwargs['venue'],
-													'region':self.kwargs['region']}
-								)
-			return JsonResponse({'days':days})
-		elif kwargs['day'] != 'nan':
-			meetings = get_data(parameter='day', 
-								previous_parameters={'venue':self.kwargs['venue'],
-													'region':self.kwargs['region'],
-													'day':self.kwargs['day']}
-								)
-			if len(meetings) == 0:
-				return JsonResponse({'meetings':'NO MEETINGS'})
-			else:
-				# Pass pretty and cleaned html table
-				return JsonResponse({'meetings':format_table(meetings)})
-		else:
-			raise ProcessingError(f"Invalid request: {request}")
+		venue, region, day = self.kwargs['venue'], self.kwargs['region'], self.kwargs['day']
+		if getattr(request, 'profiling', False):
+			# Staff profile (see profiling.py) - do the work rather than hit the cache
+			return JsonResponse(picker_data(venue, region, day))
+		# Identical requests arriving together share one computation, and 
+		# computed responses are cached for every worker
+		data = COALESCER.do((venue, region_name(region), day, SNAPSHOT.version),
+							cached_picker_data, venue, region, day)
+		return JsonResponse(data)
 
 
 
 picker = Picker.as_view()
 
+
+def stream_table(rows:ndarray, chunk:int = STREAM_CHUNK) -> Iterator[str]:
+	"""Render a meetings table a chunk of rows at a time.
+
+	Args:
+		rows (ndarray): row positions, in display order
+		chunk (int, optional): rows per chunk. Defaults to STREAM_CHUNK.
+
+	Yields:
+		Iterator[str]: consecutive pieces of one HTML table
+	"""
+	for start in range(0, max(len(rows), 1), chunk):
+		html = display_columns(SNAPSHOT.frame(rows[start:start + chunk])).to_html(**TABLE_HTML)
+		head, body, foot = split_table(html)
+		if start == 0:
+			yield head
+		yield body
+	yield foot
+
+
+def rows_page(rows:ndarray, offset:int, limit:int) -> dict:
+	"""A page of a meetings table, as returned by ``picker_rows``.
+
+	Args:
+		rows (ndarray): row positions of the whole table, in display order
+		offset (int): first row of the page
+		limit (int): most rows in the page
+
+	Returns:
+		dict: HTML table of the page, total count and next cursor
+	"""
+	page = rows[offset:offset + limit]
+	if len(page) == 0:
+		meetings = 'NO MEETINGS'
+	else:
+		meetings = display_columns(SNAPSHOT.frame(page)).to_html(**TABLE_HTML)
+	cursor = f'{SNAPSHOT.version}.{offset + limit}' if offset + limit < len(rows) else None
+	return {'meetings': meetings, 'count': len(rows), 'cursor': cursor}
+
+
+@require_GET
+def picker_rows(request:request, venue:str, region:str, day:str) -> JsonResponse:
+	"""One page of the meetings table for a venue/region/day.
+
+	Pages are cut from the meetings in display order, ``limit`` (default 
+	PAGE_SIZE) at a time; each response carries the ``cursor`` to send for 
+	the next page, or null after the last. Cursors belong to one snapshot 
+	version - after a refresh they get a 410 and the listing starts again.
+
+	Args:
+		request (request): GET request
+		venue (str): 'in-person' or 'online'
+		region (str): region from the URI, or 'SHOW ALL'
+		day (str): day name, or 'SHOW ALL'
+
+	Returns:
+		JsonResponse: HTML table of the page, total count and next cursor
+	"""
+	version, _, offset = request.GET.get('cursor', '').partition('.')
+	if version and version != SNAPSHOT.version:
+		return JsonResponse({'error': 'Snapshot has changed, start again without a cursor',
+							 'version': SNAPSHOT.version}, status=410)
+	try:
+		limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+		offset = int(offset or 0)
+	except ValueError:
+		limit = offset = -1
+	if limit < 1 or offset < 0:
+		return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+	try:
+		rows = ordered_day_rows(venue, region, day, SNAPSHOT.version)
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	return JsonResponse(rows_page(rows, offset, limit))
+
+
+@require_GET
+def picker_stream(request:request, venue:str, region:str, day:str) -> StreamingHttpResponse:
+	"""The meetings table for a venue/region/day as HTML, streamed as it's 
+	rendered so the first rows arrive before the last are built.
+
+	Args:
+		request (request): GET request
+		venue (str): 'in-person' or 'online'
+		region (str): region from the URI, or 'SHOW ALL'
+		day (str): day name, or 'SHOW ALL'
+
+	Returns:
+		StreamingHttpResponse: HTML table
+	"""
+	try:
+		rows = ordered_day_rows(venue, region, day, SNAPSHOT.version)
+	except ValueError as e:
+		return HttpResponse(str(e), status=400)
+	return StreamingHttpResponse(stream_table(rows), content_type='text/html; charset=utf-8')
+
+
+def snapshot_etag(request:request, *args, **kwargs) -> str:
+	"""ETag for responses that only depend on the loaded snapshot."""
+	return SNAPSHOT.version
+
+
+@require_GET
+def search(request:request) -> JsonResponse:
+	"""Filter meetings on any combination of facets.
+
+	Each facet is a repeatable query parameter (venue, region, day, format, 
+	time), e.g. ``?region=Auckland&region=Wellington&format=Open&time=evening``.
+	Several values widen the result within a facet, except formats, where a 
+	meeting must carry all of them. The response includes the count for every
+	facet option given the current selection.
+
+	Args:
+		request (request): GET request
+
+	Returns:
+		JsonResponse: meetings table, match count and facet counts
+	"""
+	filters = {facet: request.GET.getlist(facet) for facet in FACETS}
+	filters['day'] = [day.upper() for day in filters['day']]
+	try:
+		selected = FACET_INDEX.match(filters)
+		counts = FACET_INDEX.counts(filters)
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	rows = FACET_INDEX.rows(selected)
+	if len(rows) == 0:
+		meetings = 'NO MEETINGS'
+	else:
+		meetings = format_table(SNAPSHOT.frame(rows))
+	return JsonResponse({'count': len(rows), 'facets': counts, 'meetings': meetings})
+
+
+@require_GET
+@condition(etag_func=snapshot_etag)
+def places(request:request) -> JsonResponse:
+	"""Suburbs and towns starting with the typed text, for autocomplete.
+
+	``/places/?q=ota`` gives up to 10 places, most meetings first, each with 
+	the key to fetch its meetings from ``/places/<key>/``.
+
+	Args:
+		request (request): GET request
+
+	Returns:
+		JsonResponse: matching places
+	"""
+	response = JsonResponse({'places': SNAPSHOT.places.complete(request.GET.get('q', ''))})
+	patch_cache_control(response, public=True, max_age=MAP_MAX_AGE)
+	return response
+
+
+@require_GET
+def place_meetings(request:request, key:str) -> JsonResponse:
+	"""In-person meetings held in a suburb or town.
+
+	Args:
+		request (request): GET request
+		key (str): place key from ``places``
+
+	Returns:
+		JsonResponse: place name, meeting ids and meetings table
+	"""
+	place = SNAPSHOT.places.lookup(key)
+	if place is None:
+		raise Http404(f'No meetings in {key}')
+	rows = SNAPSHOT.places.rows[place]
+	meetings = SNAPSHOT.frame(rows)
+	return JsonResponse({'place': SNAPSHOT.places.names[place],
+						 'ids': meetings['id_bigint'].astype(int).tolist(),
+						 'meetings': format_table(meetings)})
+
+
+def feed_entry(path:str) -> Union[dict, None]:
+	"""Look up a calendar feed in the manifest written by the refresh step.
+
+	Args:
+		path (str): feed path relative to FEED_DIR, e.g. 'in-person/auckland.ics'
+
+	Returns:
+		Union[dict, None]: etag and modified time, None if there is no such feed
+	"""
+	try:
+		mtime = os.stat(os.path.join(FEED_DIR, MANIFEST)).st_mtime
+	except FileNotFoundError:
+		return None
+	if FEED_MANIFEST['mtime'] != mtime:
+		FEED_MANIFEST['entries'] = load_manifest()
+		FEED_MANIFEST['mtime'] = mtime
+	return FEED_MANIFEST['entries'].get(path)
+
+
+def feed_etag(request:request, path:str) -> Union[str, None]:
+	"""ETag for a calendar feed (content hash from the manifest)."""
+	entry = feed_entry(path + '.ics')
+	return entry['etag'] if entry else None
+
+
+def feed_last_modified(request:request, path:str) -> Union[datetime, None]:
+	"""Last-Modified time for a calendar feed (when its content last changed)."""
+	entry = feed_entry(path + '.ics')
+	if not entry:
+		return None
+	return datetime.fromisoformat(entry['modified']).astimezone(timezone.utc)
+
+
+@require_GET
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+def feed(request:request, path:str) -> FileResponse:
+	"""Serve a pre-built iCalendar feed.
+
+	Feeds are written by refresh_meetings.py; this only hands out the file. 
+	Conditional requests from polling calendar clients get a 304 from the 
+	manifest's ETag/modified time without the file being opened.
+
+	Args:
+		request (request): GET request
+		path (str): feed path without the .ics extension
+
+	Returns:
+		FileResponse: text/calendar feed
+	"""
+	if feed_entry(path + '.ics') is None:
+		raise Http404(f'No calendar feed: {path}')
+	response = FileResponse(open(os.path.join(FEED_DIR, path + '.ics'), 'rb'),
+							content_type='text/calendar; charset=utf-8')
+	patch_cache_control(response, public=True, max_age=FEED_MAX_AGE)
+	return response
+
+
+@require_GET
+def schedule(request:request, name:str, ext:str) -> FileResponse:
+	"""Serve a printable meeting list, as written by refresh_meetings.py.
+
+	Args:
+		request (request): GET request
+		name (str): 'all' or a region slug, e.g. 'hawkes-bay-and-gisborne'
+		ext (str): 'html' or 'pdf'
+
+	Returns:
+		FileResponse: meeting list page or PDF
+	"""
+	path = os.path.join(SCHEDULE_DIR, f'{name}.{ext}')
+	if not os.path.exists(path):
+		raise Http404(f'No meeting list: {name}.{ext}')
+	content_type = 'application/pdf' if ext == 'pdf' else 'text/html; charset=utf-8'
+	response = FileResponse(open(path, 'rb'), content_type=content_type)
+	patch_cache_control(response, public=True, max_age=FEED_MAX_AGE)
+	return response
+
+
+@require_GET
+@condition(etag_func=snapshot_etag)
+def map_points(request:request, venue:str, z:int, x:int, y:int) -> JsonResponse:
+	"""Clustered meeting locations for one XYZ map tile, as GeoJSON.
+
+	Clusters are built once per snapshot (see snapshot.py), so a tile is a grid
+	index lookup; tiles are addressed by z/x/y rather than a free bbox so that 
+	panning reuses cached responses.
+
+	Args:
+		request (request): GET request
+		venue (str): 'in-person' or 'online'
+		z (int): zoom
+		x (int): tile column
+		y (int): tile row
+
+	Returns:
+		JsonResponse: FeatureCollection of clusters and single meetings
+	"""
+	if venue not in SNAPSHOT.clusters or z > 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+		raise Http404(f'No map tile: {venue}/{z}/{x}/{y}')
+	clusters = SNAPSHOT.clusters[venue].get_clusters(tile_bbox(z, x, y), z)
+	points = SNAPSHOT.frame([item['row'] for item in clusters if item['row'] >= 0],
+							columns=MAP_POINT_COLS)
+	points['id_bigint'] = points['id_bigint'].astype(int)
+	points = points.fillna('').to_dict('index')
+	features = []
+	for item in clusters:
+		if item['row'] < 0:
+			properties = {'cluster': True, 'point_count': item['count']}
+		else:
+			properties = dict(points[item['row']], cluster=False, point_count=1)
+		features.append({'type': 'Feature',
+						 'geometry': {'type': 'Point', 
+				   					  'coordinates': [round(item['lng'], 6), round(item['lat'], 6)]},
+						 'properties': properties})
+	response = JsonResponse({'type': 'FeatureCollection', 'features': features},
+							content_type='application/geo+json')
+	patch_cache_control(response, public=True, max_age=MAP_MAX_AGE)
+	return response
+
+
+def region_layer_modified(request:request, z:int) -> Union[datetime, None]:
+	"""Last-Modified time of a region layer (only rewritten when it changes)."""
+	try:
+		mtime = os.stat(region_layer_path(z)).st_mtime
+	except FileNotFoundError:
+		return None
+	return datetime.fromtimestamp(mtime, tz=timezone.utc)
+
+
+@require_GET
+@condition(last_modified_func=region_layer_modified)
+def map_regions(request:request, z:int) -> FileResponse:
+	"""Region boundaries simplified for a zoom level, as GeoJSON.
+
+	Args:
+		request (request): GET request
+		z (int): zoom
+
+	Returns:
+		FileResponse: FeatureCollection of region polygons
+	"""
+	path = region_layer_path(z)
+	if not os.path.exists(path):
+		raise Http404(f'No region layer for zoom {z}')
+	response = FileResponse(open(path, 'rb'), content_type='application/geo+json')
+	patch_cache_control(response, public=True, max_age=MAP_MAX_AGE)
+	return response
+
+
+def snapshot_prefetch() -> List[str]:
+	"""Click-path URLs a client should cache as soon as a snapshot is published:
+	the region and day lists. Meeting tables are cached as they're viewed.
+
+	Returns:
+		List[str]: URL paths
+	"""
+	urls = ['/in-person/nan/nan/', '/online/nan/nan/']
+	for venue in ('in-person', 'online'):
+		for region in get_data(parameter='venue', previous_parameters={'venue': venue}):
+			if region != 'NONE':
+				urls.append(f'/{venue}/{quote(region)}/nan/')
+	return urls
+
+
+@lru_cache(maxsize=2)
+def snapshot_manifest_data(version:str, day:str) -> dict:
+	"""Manifest of the loaded snapshot for the service worker, built on first use.
+
+	Args:
+		version (str): snapshot version
+		day (str): day tables are ordered from (today)
+
+	Returns:
+		dict: snapshot version, day and URLs to prefetch
+	"""
+	return {'version': version, 'day': day, 'prefetch': snapshot_prefetch()}
+
+
+def snapshot_manifest_etag(request:request) -> str:
+	"""ETag for the snapshot manifest: the snapshot version and today, as
+	cached tables go stale when either changes."""
+	return f'{SNAPSHOT.version}-{ordered_days()[0]}'
+
+
+@require_GET
+@condition(etag_func=snapshot_manifest_etag)
+def snapshot_manifest(request:request) -> JsonResponse:
+	"""Version of the loaded snapshot, and the day its tables are ordered
+	from, for the service worker to revalidate its cached meeting data against.
+
+	Args:
+		request (request): GET request
+
+	Returns:
+		JsonResponse: snapshot version, day and URLs to prefetch
+	"""
+	response = JsonResponse(snapshot_manifest_data(SNAPSHOT.version, ordered_days()[0]))
+	patch_cache_control(response, no_cache=True)
+	return response
+
+
+@require_GET
+def service_worker(request:request) -> HttpResponse:
+	"""Service worker script, served from the site root so it covers every page.
+
+	Args:
+		request (request): GET request
+
+	Returns:
+		HttpResponse: JavaScript
+	"""
+	response = render(request, 'sw.js', content_type='application/javascript')
+	patch_cache_control(response, no_cache=True)
+	return response
+
+
+def changes_etag(request:request) -> Union[str, None]:
+	"""ETag for a delta: the version asked from and the latest version."""
+	versions = load_versions()
+	if not versions:
+		return None
+	return f"{request.GET.get('since', '')}-{versions[-1]['version']}"
+
+
+@require_GET
+@condition(etag_func=changes_etag)
+def changes(request:request) -> JsonResponse:
+	"""Meetings added, changed and removed since a snapshot version.
+
+	``/changes/?since=<version>`` returns the composed delta from that version
+	to the latest recorded by refresh_meetings.py. Without ``since`` every 
+	meeting is returned as added, to start a consumer off. A version too old
+	to be in the history gets a 410, and the consumer should start again.
+
+	Args:
+		request (request): GET request
+
+	Returns:
+		JsonResponse: delta with from/to versions
+	"""
+	versions = load_versions()
+	if not versions:
+		return JsonResponse({'error': 'No snapshot history yet'}, status=503)
+	since = request.GET.get('since')
+	if since is None:
+		delta = {'added': latest_rows(), 'changed': {},
+				 'removed': [], 'from': None, 'to': versions[-1]['version']}
+	else:
+		delta = changes_since(since)
+		if delta is None:
+			return JsonResponse({'error': f'Unknown version: {since}', 
+								 'version': versions[-1]['version']}, status=410)
+	response = JsonResponse(delta)
+	patch_cache_control(response, public=True, max_age=MAP_MAX_AGE)
+	return response
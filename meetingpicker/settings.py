@@ -54,8 +54,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Removes itself unless PROFILE_SECRET is set
+    'meetingpicker.apps.picker.profiling.ProfilingMiddleware',
 ]
 
+# Staff profiling of single requests (see meetingpicker/apps/picker/profiling.py)
+PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+PROFILE_DIR = os.path.join(BASE_DIR, 'data/profiles')
+
 ROOT_URLCONF = 'meetingpicker.urls'
 
 TEMPLATES = [
@@ -88,6 +94,39 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Picker responses are cached under the snapshot version. PICKER_CACHE picks the
+# backend: 'locmem' (default, one cache per worker), or 'file', 'memcached' or 
+# 'redis', shared by all workers (memcached and redis need pymemcache or redis
+# installed).
+# PICKER_CACHE_LOCATION overrides the directory or server address.
+
+PICKER_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'picker'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', 
+             os.path.join(BASE_DIR, 'data/cache')),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+PICKER_CACHE = os.getenv('PICKER_CACHE', 'locmem')
+PICKER_CACHE_BACKEND, PICKER_CACHE_LOCATION = PICKER_CACHE_BACKENDS[PICKER_CACHE]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'picker': {
+        'BACKEND': PICKER_CACHE_BACKEND,
+        'LOCATION': os.getenv('PICKER_CACHE_LOCATION') or PICKER_CACHE_LOCATION,
+        'KEY_PREFIX': 'picker',
+        # Entries for old snapshot versions are never read again - let them expire
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 2000} if PICKER_CACHE in ('locmem', 'file') else {},
+    },
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -0,0 +1,122 @@
+{% load static %}// Service worker for the meeting picker.
+// The app shell and meeting data are served from the device's cache, so repeat
+// visits (and visits on a bad connection) load straight away. On every page
+// load the snapshot manifest is checked in the background; when its version
+// changes, or the day tables are ordered from (today) moves on, the cached
+// meeting data is replaced.
+const SHELL_CACHE = 'picker-shell-v1';
+const DATA_PREFIX = 'picker-data-';
+const MANIFEST_URL = '{% url "na_picker:snapshot_manifest" %}';
+const SHELL_URLS = ['/nan/nan/nan/', "{% static 'modstyles.css' %}", "{% static 'favicon.png' %}"];
+const CDN_URLS = ['https://maxcdn.bootstrapcdn.com/bootstrap/3.3.7/css/bootstrap.min.css',
+                  'https://ajax.googleapis.com/ajax/libs/jquery/1.12.4/jquery.min.js'];
+// Steps of the venue/region/day click path, and pages of long meeting tables
+const DATA_PATH = /^\/(in-person|online)\/[^/]+\/[^/]+\/(rows\/)?$/;
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(caches.open(SHELL_CACHE).then(function(cache) {
+        return Promise.all([cache.addAll(SHELL_URLS)].concat(CDN_URLS.map(function(url) {
+            return fetch(url, {mode: 'no-cors'}).then(function(response) {
+                return cache.put(url, response);
+            });
+        })));
+    }).then(function() { return self.skipWaiting(); }));
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(self.clients.claim());
+});
+
+// Regions reach the server with "_" for spaces and "__" for apostrophes (and
+// the page also sends a CSRF token in the query string); key cached data on the
+// decoded path so every spelling of a request shares one entry. Table pages
+// are told apart by their cursor
+function dataKey(url) {
+    const parts = url.pathname.split('/').filter(Boolean).map(decodeURIComponent);
+    parts[1] = parts[1].replace(/__/g, "'").replace(/_/g, ' ');
+    const cursor = url.searchParams.get('cursor');
+    return url.origin + '/' + parts.map(encodeURIComponent).join('/') + '/' +
+        (cursor ? '?cursor=' + encodeURIComponent(cursor) : '');
+}
+
+// Only one data cache (the current snapshot's, for today) exists at a time
+function dataCache() {
+    return caches.keys().then(function(names) {
+        const current = names.filter(function(name) { return name.startsWith(DATA_PREFIX); });
+        return caches.open(current.length ? current[0] : DATA_PREFIX + 'initial');
+    });
+}
+
+// Compare the cached data's version and day with the server's, and swap in
+// fresh data if either has changed - tables list today's meetings first
+function checkVersion() {
+    return fetch(MANIFEST_URL, {cache: 'no-cache'}).then(function(response) {
+        return response.json();
+    }).then(function(manifest) {
+        const name = DATA_PREFIX + manifest.version + '-' + manifest.day;
+        return caches.keys().then(function(names) {
+            if (names.indexOf(name) != -1) {
+                return;
+            }
+            return caches.open(name).then(function(cache) {
+                return Promise.all(manifest.prefetch.map(function(path) {
+                    const url = new URL(path, self.location.origin);
+                    return fetch(url).then(function(response) {
+                        if (response.ok) {
+                            return cache.put(dataKey(url), response);
+                        }
+                    });
+                }));
+            }).then(function() {
+                return Promise.all(names.filter(function(old) {
+                    return old.startsWith(DATA_PREFIX) && old != name;
+                }).map(function(old) { return caches.delete(old); }));
+            });
+        });
+    });
+}
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    if (request.method != 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (request.mode == 'navigate') {
+        // App shell: answer from cache, refresh it and the data behind the scenes
+        const key = url.origin + url.pathname;
+        const network = fetch(request).then(function(response) {
+            if (response.ok) {
+                const copy = response.clone();
+                caches.open(SHELL_CACHE).then(function(cache) { cache.put(key, copy); });
+            }
+            return response;
+        });
+        event.respondWith(caches.match(key).then(function(cached) {
+            return cached || network;
+        }));
+        event.waitUntil(Promise.all([network, checkVersion()]).catch(function() {}));
+        return;
+    }
+    if (url.origin == self.location.origin && DATA_PATH.test(url.pathname)) {
+        const key = dataKey(url);
+        event.respondWith(dataCache().then(function(cache) {
+            return cache.match(key).then(function(cached) {
+                if (cached) {
+                    return cached;
+                }
+                return fetch(request).then(function(response) {
+                    if (response.ok) {
+                        cache.put(key, response.clone());
+                    }
+                    return response;
+                });
+            });
+        }));
+        return;
+    }
+    // Stylesheets, scripts and icons from the shell cache, anything else from the network
+    event.respondWith(caches.match(request).then(function(cached) {
+        return cached || fetch(request);
+    }));
+});
@@ -0,0 +1,218 @@
+"""Version history of the meeting snapshot, and deltas between versions.
+
+Each refresh that produces a different data/all_meetings.csv is recorded
+under its content hash, together with a delta against the previous version:
+meetings added, removed, and the fields that changed, keyed by id_bigint.
+Consumers that already hold some version fetch the composed delta from there
+to the latest instead of downloading the whole list again.
+
+Rows are compared with their venue's address fields filled back in (see
+meetingpicker.utils.venues), so an address change shows up as a change to
+each meeting held there.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from hashlib import sha1
+from typing import Dict, List, Union
+
+import pandas as pd
+
+from meetingpicker.utils.venues import ADDRESS_COLS
+
+
+HISTORY_DIR = 'data/history'
+VERSIONS = 'versions.json'
+LATEST = 'latest.csv'
+LATEST_VENUES = 'latest_venues.csv'
+# Deltas kept; consumers further behind than this re-download everything
+MAX_VERSIONS = 500
+
+
+def file_version(*paths:str) -> str:
+    """Version of a snapshot: a hash of the content of its files.
+
+    Args:
+        paths (str): snapshot CSV, and venue CSV if there is one
+
+    Returns:
+        str: version
+    """
+    digest = sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def read_rows(path:str, venues_path:str = None) -> Dict[str, dict]:
+    """Read a snapshot as a dict of rows keyed by id_bigint.
+
+    Every value is read as text ('' when empty) so unchanged values compare
+    equal however pandas would otherwise have typed the column.
+
+    Args:
+        path (str): snapshot CSV
+        venues_path (str, optional): venue CSV, for snapshots whose meetings
+            refer to venues by venue_id. Defaults to None.
+
+    Returns:
+        Dict[str, dict]: row fields by meeting id
+    """
+    meetings = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if 'id_bigint' not in meetings.columns:
+        return {}
+    if venues_path and 'venue_id' in meetings.columns:
+        venues = pd.read_csv(venues_path, dtype=str, keep_default_na=False)
+        meetings = meetings.merge(venues[['venue_id'] + ADDRESS_COLS], how='left', on='venue_id')\
+                           .drop(columns='venue_id').fillna('')
+    # A meeting matched to two overlapping regions is listed twice - keep one
+    meetings = meetings.drop_duplicates('id_bigint').set_index('id_bigint')
+    return meetings.to_dict('index')
+
+
+def diff_rows(old:Dict[str, dict], new:Dict[str, dict]) -> dict:
+    """Per-meeting differences between two snapshots.
+
+    Args:
+        old (Dict[str, dict]): previous rows, from ``read_rows``
+        new (Dict[str, dict]): current rows, from ``read_rows``
+
+    Returns:
+        dict: added (full rows), changed (changed fields only) and removed (ids)
+    """
+    added = {key: row for key, row in new.items() if key not in old}
+    removed = sorted(key for key in old if key not in new)
+    changed = {}
+    for key, row in new.items():
+        if key in old and row != old[key]:
+            changed[key] = {field: value for field, value in row.items()
+                            if old[key].get(field) != value}
+    return {'added': added, 'changed': changed, 'removed': removed}
+
+
+def compose(deltas:List[dict]) -> dict:
+    """Combine consecutive deltas into one.
+
+    Args:
+        deltas (List[dict]): deltas, oldest first
+
+    Returns:
+        dict: single delta with the same effect
+    """
+    added, changed, removed = {}, {}, set()
+    for delta in deltas:
+        for key in delta['removed']:
+            if added.pop(key, None) is None:
+                removed.add(key)
+            changed.pop(key, None)
+        for key, row in delta['added'].items():
+            removed.discard(key)
+            changed.pop(key, None)
+            added[key] = dict(row)
+        for key, fields in delta['changed'].items():
+            if key in added:
+                added[key].update(fields)
+            else:
+                changed.setdefault(key, {}).update(fields)
+    return {'added': added, 'changed': changed, 'removed': sorted(removed)}
+
+
+def load_versions(history_dir:str = HISTORY_DIR) -> List[dict]:
+    """Recorded versions, oldest first.
+
+    Args:
+        history_dir (str, optional): history directory. Defaults to HISTORY_DIR.
+
+    Returns:
+        List[dict]: version and created time of each recorded snapshot
+    """
+    try:
+        with open(os.path.join(history_dir, VERSIONS)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def latest_rows(history_dir:str = HISTORY_DIR) -> Dict[str, dict]:
+    """Rows of the latest recorded snapshot, keyed by id_bigint.
+
+    Args:
+        history_dir (str, optional): history directory. Defaults to HISTORY_DIR.
+
+    Returns:
+        Dict[str, dict]: row fields by meeting id
+    """
+    venues = os.path.join(history_dir, LATEST_VENUES)
+    return read_rows(os.path.join(history_dir, LATEST),
+                     venues if os.path.exists(venues) else None)
+
+
+def record_snapshot(path:str, venues_path:str = None,
+                    history_dir:str = HISTORY_DIR) -> Union[str, None]:
+    """Add a snapshot to the history if its content is new.
+
+    Args:
+        path (str): snapshot CSV just written by the refresh
+        venues_path (str, optional): venue CSV written with it. Defaults to None.
+        history_dir (str, optional): history directory. Defaults to HISTORY_DIR.
+
+    Returns:
+        Union[str, None]: new version, None if the snapshot hasn't changed
+    """
+    os.makedirs(os.path.join(history_dir, 'deltas'), exist_ok=True)
+    versions = load_versions(history_dir)
+    version = file_version(path, venues_path) if venues_path else file_version(path)
+    if versions and versions[-1]['version'] == version:
+        return None
+    latest = os.path.join(history_dir, LATEST)
+    if versions and os.path.exists(latest):
+        delta = diff_rows(latest_rows(history_dir), read_rows(path, venues_path))
+        delta.update({'from': versions[-1]['version'], 'to': version})
+        with open(os.path.join(history_dir, 'deltas', f'{version}.json'), 'w') as f:
+            json.dump(delta, f, separators=(',', ':'))
+    else:
+        # Nothing to diff against - history starts again from this version
+        versions = []
+    shutil.copyfile(path, latest + '.tmp')
+    os.replace(latest + '.tmp', latest)
+    latest_venues = os.path.join(history_dir, LATEST_VENUES)
+    if venues_path:
+        shutil.copyfile(venues_path, latest_venues + '.tmp')
+        os.replace(latest_venues + '.tmp', latest_venues)
+    elif os.path.exists(latest_venues):
+        os.remove(latest_venues)
+    versions.append({'version': version,
+                     'created': datetime.now(timezone.utc).replace(microsecond=0).isoformat()})
+    for old in versions[:-MAX_VERSIONS]:
+        delta_path = os.path.join(history_dir, 'deltas', f'{old["version"]}.json')
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+    versions = versions[-MAX_VERSIONS:]
+    with open(os.path.join(history_dir, VERSIONS + '.tmp'), 'w') as f:
+        json.dump(versions, f, indent=0)
+    os.replace(os.path.join(history_dir, VERSIONS + '.tmp'), os.path.join(history_dir, VERSIONS))
+    return version
+
+
+def changes_since(since:str, history_dir:str = HISTORY_DIR) -> Union[dict, None]:
+    """Delta from a recorded version to the latest one.
+
+    Args:
+        since (str): version the consumer holds
+        history_dir (str, optional): history directory. Defaults to HISTORY_DIR.
+
+    Returns:
+        Union[dict, None]: composed delta, None if ``since`` isn't in the history
+    """
+    versions = [entry['version'] for entry in load_versions(history_dir)]
+    if since not in versions:
+        return None
+    deltas = []
+    for version in versions[versions.index(since) + 1:]:
+        with open(os.path.join(history_dir, 'deltas', f'{version}.json')) as f:
+            deltas.append(json.load(f))
+    delta = compose(deltas)
+    delta.update({'from': since, 'to': versions[-1]})
+    return delta
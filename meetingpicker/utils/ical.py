@@ -0,0 +1,286 @@
+"""Build RFC 5545 iCalendar feeds from the meeting snapshot.
+
+Feeds are written by the refresh step into FEED_DIR, one per venue/region,
+venue/region/day and per meeting.  A manifest keeps a content hash for each
+feed, so a refresh only rewrites (and bumps the timestamp of) feeds whose
+meetings actually changed, and the web app can answer calendar clients'
+polling with 304s using those hashes as ETags.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from hashlib import sha1
+from typing import Dict, List
+
+import pandas as pd
+from django.utils.text import slugify
+
+from meetingpicker.utils.times import start_minutes
+
+
+FEED_DIR = 'data/feeds'
+MANIFEST = 'manifest.json'
+UID_DOMAIN = 'picker.nzna.org'
+PRODID = '-//NZNA//Meeting Picker//EN'
+TZID = 'Pacific/Auckland'
+# Weekly events all start from the first matching weekday on/after this date,
+# so the feed content doesn't change from one refresh to the next
+ANCHOR_DATE = date(2024, 1, 1)
+BYDAY = {'MONDAY': 'MO',
+         'TUESDAY': 'TU',
+         'WEDNESDAY': 'WE',
+         'THURSDAY': 'TH',
+         'FRIDAY': 'FR',
+         'SATURDAY': 'SA',
+         'SUNDAY': 'SU',
+         }
+VENUES = {'in-person': ('in-person', 'hybrid'),
+          'online': ('online', 'hybrid'),
+          }
+# NZST/NZDT: daylight time from the last Sunday of September to the first
+# Sunday of April
+VTIMEZONE = ['BEGIN:VTIMEZONE',
+             f'TZID:{TZID}',
+             'BEGIN:DAYLIGHT',
+             'TZOFFSETFROM:+1200',
+             'TZOFFSETTO:+1300',
+             'TZNAME:NZDT',
+             'DTSTART:19700927T020000',
+             'RRULE:FREQ=YEARLY;BYMONTH=9;BYDAY=-1SU',
+             'END:DAYLIGHT',
+             'BEGIN:STANDARD',
+             'TZOFFSETFROM:+1300',
+             'TZOFFSETTO:+1200',
+             'TZNAME:NZST',
+             'DTSTART:19700405T030000',
+             'RRULE:FREQ=YEARLY;BYMONTH=4;BYDAY=1SU',
+             'END:STANDARD',
+             'END:VTIMEZONE']
+LOCATION_COLS = ['Location Name', 'Street Address', 'Neighborhood', 'Town']
+
+
+def escape(text:str) -> str:
+    """Escape a TEXT value for iCalendar.
+
+    Args:
+        text (str): raw text
+
+    Returns:
+        str: escaped text
+    """
+    return str(text).replace('\\', '\\\\').replace(';', '\\;')\
+                    .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line:str) -> str:
+    """Fold a content line at 75 octets, as RFC 5545 requires.
+
+    Args:
+        line (str): unfolded content line
+
+    Returns:
+        str: folded line, continuation lines starting with a space
+    """
+    parts = []
+    current = ''
+    size = 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > 75:
+            parts.append(current)
+            current = ' '
+            size = 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+
+def feed_path(venue:str, region:str = None, day:str = None) -> str:
+    """Relative path of a venue/region(/day) feed inside FEED_DIR.
+
+    Args:
+        venue (str): 'in-person' or 'online'
+        region (str, optional): region name, None for all regions. Defaults to None.
+        day (str, optional): day name, None for every day. Defaults to None.
+
+    Returns:
+        str: relative path, e.g. 'in-person/auckland/monday.ics'
+    """
+    name = slugify(region) if region else 'all'
+    if day is None:
+        return f'{venue}/{name}.ics'
+    return f'{venue}/{name}/{day.lower()}.ics'
+
+
+def meeting_path(meeting_id:int) -> str:
+    """Relative path of a single meeting's feed inside FEED_DIR.
+
+    Args:
+        meeting_id (int): BMLT id_bigint
+
+    Returns:
+        str: relative path
+    """
+    return f'meetings/{meeting_id}.ics'
+
+
+def _blank(value) -> bool:
+    return pd.isnull(value) or str(value).strip() == ''
+
+
+def meeting_event(meeting:dict) -> List[str]:
+    """VEVENT lines (without DTSTAMP) for one weekly meeting.
+
+    Args:
+        meeting (dict): one row of the meeting snapshot
+
+    Returns:
+        List[str]: unfolded content lines
+    """
+    byday = BYDAY[meeting['Day']]
+    start = ANCHOR_DATE + timedelta(days=(list(BYDAY.values()).index(byday) -
+                                          ANCHOR_DATE.weekday()) % 7)
+    start_at = start_minutes(meeting['Start Time'])
+    if start_at < 0:
+        raise ValueError(f'Unreadable start time {meeting["Start Time"]!r}')
+    hours, minutes = str(meeting['Duration']).strip().split(':')[:2]
+    lines = [f'UID:meeting-{int(meeting["id_bigint"])}@{UID_DOMAIN}',
+             f'DTSTART;TZID={TZID}:{start:%Y%m%d}T{start_at // 60:02d}{start_at % 60:02d}00',
+             f'DURATION:PT{int(hours)}H{int(minutes)}M',
+             f'RRULE:FREQ=WEEKLY;BYDAY={byday}',
+             f'SUMMARY:{escape(meeting["Meeting Name"])}']
+    location = [str(meeting[col]).strip() for col in LOCATION_COLS if not _blank(meeting.get(col))]
+    if location:
+        lines.append(f'LOCATION:{escape(", ".join(location))}')
+    description = []
+    for col in ('Formats', 'Virtual Meeting Link', 'Virtual Meeting Additional Info',
+                'Phone Meeting Dial-in Number', 'Additional Location Information', 'Comments'):
+        if not _blank(meeting.get(col)):
+            description.append(str(meeting[col]).strip())
+    if description:
+        lines.append(f'DESCRIPTION:{escape(chr(10).join(description))}')
+    if not _blank(meeting.get('Virtual Meeting Link')):
+        lines.append(f'URL:{str(meeting["Virtual Meeting Link"]).strip()}')
+    return lines
+
+
+def render_calendar(name:str, events:List[List[str]], dtstamp:datetime) -> str:
+    """Render a full VCALENDAR.
+
+    Args:
+        name (str): calendar display name
+        events (List[List[str]]): VEVENT bodies from ``meeting_event``
+        dtstamp (datetime): UTC timestamp stamped on every event
+
+    Returns:
+        str: iCalendar text with CRLF line endings
+    """
+    lines = ['BEGIN:VCALENDAR',
+             'VERSION:2.0',
+             f'PRODID:{PRODID}',
+             'CALSCALE:GREGORIAN',
+             'METHOD:PUBLISH',
+             f'X-WR-CALNAME:{escape(name)}',
+             f'X-WR-TIMEZONE:{TZID}'] + VTIMEZONE
+    for event in events:
+        lines += ['BEGIN:VEVENT', f'DTSTAMP:{dtstamp:%Y%m%dT%H%M%SZ}'] + event + ['END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def build_feeds(meetings:pd.DataFrame) -> Dict[str, tuple]:
+    """Work out every feed and the events that belong in it.
+
+    Args:
+        meetings (pd.DataFrame): meeting snapshot, as saved by refresh_meetings.py
+
+    Returns:
+        Dict[str, tuple]: relative path -> (calendar name, list of events)
+    """
+    meetings = meetings.loc[meetings['Day'].isin(BYDAY.keys())]
+    # Events go in day, start time and id order rather than snapshot order,
+    # which shifts between refreshes for meetings at the same day and time,
+    # so a feed's content (and ETag) only changes when its meetings do
+    days = list(BYDAY)
+    keys = [(days.index(day), start_minutes(start), int(meeting_id)) for day, start, meeting_id
+            in zip(meetings['Day'].values, meetings['Start Time'].values,
+                   meetings['id_bigint'].values)]
+    meetings = meetings.iloc[sorted(range(len(meetings)), key=keys.__getitem__)]
+    events = {int(row['id_bigint']): meeting_event(row) for row in meetings.to_dict('records')}
+    feeds = {}
+    for meeting_id, event in events.items():
+        feeds[meeting_path(meeting_id)] = ('NA Meeting', [event])
+    for venue, venue_types in VENUES.items():
+        selected = meetings.loc[meetings['venue'].isin(venue_types)]
+        regions = [None] + sorted(selected['region'].dropna().unique().tolist())
+        for region in regions:
+            in_region = selected if region is None else selected.loc[selected['region'] == region]
+            title = f'NA Meetings - {region or "All Regions"} ({venue})'
+            # A meeting inside overlapping region shapes has a row for each
+            # region, but may only be one event in a calendar
+            ids = in_region['id_bigint'].astype(int).drop_duplicates().tolist()
+            feeds[feed_path(venue, region)] = (title, [events[i] for i in ids])
+            for day in in_region['Day'].unique():
+                day_ids = in_region.loc[in_region['Day'] == day, 'id_bigint'].astype(int)\
+                                   .drop_duplicates().tolist()
+                feeds[feed_path(venue, region, day)] = (f'{title} {day.title()}',
+                                                        [events[i] for i in day_ids])
+    return feeds
+
+
+def load_manifest(feed_dir:str = FEED_DIR) -> Dict[str, dict]:
+    """Read the feed manifest (relative path -> etag and modified time).
+
+    Args:
+        feed_dir (str, optional): feed directory. Defaults to FEED_DIR.
+
+    Returns:
+        Dict[str, dict]: manifest, empty if no feeds have been written yet
+    """
+    try:
+        with open(os.path.join(feed_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_feeds(meetings:pd.DataFrame, feed_dir:str = FEED_DIR) -> List[str]:
+    """Write feeds for the snapshot, touching only the ones that changed.
+
+    Args:
+        meetings (pd.DataFrame): meeting snapshot
+        feed_dir (str, optional): output directory. Defaults to FEED_DIR.
+
+    Returns:
+        List[str]: relative paths of feeds written or removed
+    """
+    manifest = load_manifest(feed_dir)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    updated = {}
+    changed = []
+    for path, (name, events) in build_feeds(meetings).items():
+        # Hash with a fixed DTSTAMP so unchanged meetings give an unchanged hash
+        etag = sha1(render_calendar(name, events, epoch).encode('utf-8')).hexdigest()
+        full_path = os.path.join(feed_dir, path)
+        previous = manifest.get(path)
+        if previous and previous['etag'] == etag and os.path.exists(full_path):
+            updated[path] = previous
+            continue
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+            f.write(render_calendar(name, events, now))
+        os.replace(full_path + '.tmp', full_path)
+        updated[path] = {'etag': etag, 'modified': now.isoformat()}
+        changed.append(path)
+    # Meetings or regions that no longer exist
+    for path in set(manifest) - set(updated):
+        if os.path.exists(os.path.join(feed_dir, path)):
+            os.remove(os.path.join(feed_dir, path))
+        changed.append(path)
+    os.makedirs(feed_dir, exist_ok=True)
+    with open(os.path.join(feed_dir, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(updated, f, indent=0, sort_keys=True)
+    os.replace(os.path.join(feed_dir, MANIFEST + '.tmp'), os.path.join(feed_dir, MANIFEST))
+    return changed
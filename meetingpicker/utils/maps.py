@@ -0,0 +1,93 @@
+"""Region boundary layers for the meeting map.
+
+The full-resolution static/regions.shp is far too detailed to send to a
+browser.  The refresh step writes one GeoJSON layer per zoom level, simplified
+to about a pixel at that zoom and with coordinates rounded to match, into
+MAP_DIR, where the map view serves them as static files.
+"""
+import json
+import math
+import os
+from typing import List
+
+
+MAP_DIR = 'data/map'
+MIN_ZOOM = 0
+MAX_ZOOM = 12
+
+
+def region_layer_path(zoom:int, map_dir:str = MAP_DIR) -> str:
+    """File holding the region layer for a zoom (clamped to the zooms written).
+
+    Args:
+        zoom (int): map zoom
+        map_dir (str, optional): layer directory. Defaults to MAP_DIR.
+
+    Returns:
+        str: path to the GeoJSON file
+    """
+    zoom = max(MIN_ZOOM, min(int(zoom), MAX_ZOOM))
+    return os.path.join(map_dir, f'regions-{zoom}.geojson')
+
+
+def tolerance(zoom:int) -> float:
+    """Size of one 256px-tile pixel at a zoom, in degrees.
+
+    Args:
+        zoom (int): map zoom
+
+    Returns:
+        float: simplification tolerance
+    """
+    return 360 / (256 * 2 ** zoom)
+
+
+def round_coordinates(coordinates, decimals:int):
+    """Round nested GeoJSON coordinate arrays.
+
+    Args:
+        coordinates (list): GeoJSON coordinates, any nesting depth
+        decimals (int): decimal places to keep
+
+    Returns:
+        list: rounded coordinates
+    """
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, decimals) for value in coordinates]
+    return [round_coordinates(part, decimals) for part in coordinates]
+
+
+def write_region_layers(regions, map_dir:str = MAP_DIR) -> List[str]:
+    """Write a simplified region layer per zoom, skipping unchanged files.
+
+    Args:
+        regions (gp.GeoDataFrame): regions read from static/regions.shp
+        map_dir (str, optional): output directory. Defaults to MAP_DIR.
+
+    Returns:
+        List[str]: paths of layers that were (re)written
+    """
+    os.makedirs(map_dir, exist_ok=True)
+    # Only NZ regions are shown; the international shapes exist to filter meetings
+    regions = regions.loc[regions['intl'] == 0, ['region', 'geometry']]
+    written = []
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        layer = regions.copy()
+        layer['geometry'] = regions.geometry.simplify(tolerance(zoom), preserve_topology=True)
+        layer = layer.loc[~layer.geometry.is_empty]
+        decimals = max(2, math.ceil(-math.log10(tolerance(zoom))) + 1)
+        geojson = json.loads(layer.to_json(drop_id=True))
+        for feature in geojson['features']:
+            feature['geometry']['coordinates'] = round_coordinates(
+                feature['geometry']['coordinates'], decimals)
+        text = json.dumps(geojson, separators=(',', ':'))
+        path = region_layer_path(zoom, map_dir)
+        if os.path.exists(path):
+            with open(path) as f:
+                if f.read() == text:
+                    continue
+        with open(path + '.tmp', 'w') as f:
+            f.write(text)
+        os.replace(path + '.tmp', path)
+        written.append(path)
+    return written
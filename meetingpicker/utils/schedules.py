@@ -0,0 +1,253 @@
+"""Printable meeting lists, one per region and one for all of New Zealand.
+
+Service bodies print a weekly list of the in-person (and hybrid) meetings in
+their region.  The refresh step writes each list into SCHEDULE_DIR as a
+self-contained HTML page laid out for A4 paper, grouped by day and ordered by
+start time within each day, and, given a local PDF renderer (wkhtmltopdf or
+headless Chromium), as a PDF next to it.
+
+Lists are rendered in a process pool, and only for regions whose meetings
+changed: a manifest keeps a hash of the meetings behind each list, and lists
+whose hash is unchanged are left alone.
+"""
+import json
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from hashlib import sha1
+from html import escape
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from django.utils.text import slugify
+
+from meetingpicker.utils.times import start_minutes
+
+
+SCHEDULE_DIR = 'data/schedules'
+MANIFEST = 'manifest.json'
+TIMEZONE = 'Pacific/Auckland'
+VENUE_TYPES = ('in-person', 'hybrid')
+# A printed list covers a week, so it starts on Monday rather than today as
+# the picker does; within a day, meetings are in start time order as there
+DAYS = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY', 'SUNDAY')
+FIELDS = ['Day', 'Start Time', 'Duration', 'Meeting Name', 'Location Name', 'Street Address',
+          'Neighborhood', 'Town', 'Additional Location Information', 'Comments', 'Formats',
+          'Virtual Meeting Link']
+STYLE = """
+@page { size: A4; margin: 15mm 12mm; }
+body { font-family: Helvetica, Arial, sans-serif; font-size: 9.5pt; color: #000; }
+h1 { font-size: 16pt; margin: 0 0 2mm; }
+p.updated { margin: 0 0 4mm; color: #444; }
+h2 { font-size: 12pt; margin: 5mm 0 1mm; border-bottom: 1px solid #000; break-after: avoid; page-break-after: avoid; }
+table { width: 100%; border-collapse: collapse; }
+td { padding: 1mm 1.5mm; vertical-align: top; border-bottom: 1px solid #ccc; }
+tr { break-inside: avoid; page-break-inside: avoid; }
+td.time { width: 18mm; white-space: nowrap; }
+td.name { width: 45mm; font-weight: bold; }
+td.formats { width: 35mm; }
+.note { color: #444; font-style: italic; }
+"""
+
+
+def _text(value) -> str:
+    return '' if pd.isnull(value) else str(value).strip()
+
+
+def schedule_path(region:str = None) -> str:
+    """Relative path (without extension) of a region's list inside SCHEDULE_DIR.
+
+    Args:
+        region (str, optional): region name, None for all of New Zealand. Defaults to None.
+
+    Returns:
+        str: relative path, e.g. 'hawkes-bay-and-gisborne'
+    """
+    return slugify(region) if region else 'all'
+
+
+def list_minutes(start_time:str) -> int:
+    """Sort position of a start time within a day; unreadable times go last."""
+    minutes = start_minutes(start_time)
+    return minutes if minutes >= 0 else 24 * 60
+
+
+def schedule_meetings(meetings:pd.DataFrame) -> List[dict]:
+    """The fields a printed list shows, for meetings in list order.
+
+    Args:
+        meetings (pd.DataFrame): meetings of one list
+
+    Returns:
+        List[dict]: meetings by day (Monday first), then start time, name and id
+    """
+    rows = [row for row in meetings.to_dict('records') if _text(row.get('Day')) in DAYS]
+    # Meetings at the same time are ordered by name and id, not by where they
+    # happen to sit in the snapshot, so a list only changes when its meetings do
+    rows.sort(key=lambda row: (DAYS.index(_text(row['Day'])), list_minutes(row['Start Time']),
+                               _text(row.get('Meeting Name')), int(row['id_bigint'])))
+    return [{field: _text(row.get(field)) for field in FIELDS} for row in rows]
+
+
+def render_schedule(title:str, meetings:List[dict], updated:str) -> str:
+    """Print-ready HTML page of a meeting list.
+
+    Args:
+        title (str): list title
+        meetings (List[dict]): meetings from ``schedule_meetings``
+        updated (str): date shown as when the list was made
+
+    Returns:
+        str: HTML
+    """
+    parts = ['<!DOCTYPE html>', '<html lang="en">', '<head>', '<meta charset="utf-8">',
+             f'<title>{escape(title)}</title>', f'<style>{STYLE}</style>', '</head>', '<body>',
+             f'<h1>{escape(title)}</h1>', f'<p class="updated">Updated {escape(updated)}</p>']
+    day = None
+    for meeting in meetings:
+        if meeting['Day'] != day:
+            if day is not None:
+                parts.append('</table>')
+            day = meeting['Day']
+            parts += [f'<h2>{day.title()}</h2>', '<table>']
+        place = ', '.join(filter(None, [meeting['Neighborhood'], meeting['Town']]))
+        location = '<br>'.join(escape(line) for line in filter(None, [
+            meeting['Location Name'], meeting['Street Address'], place]))
+        notes = [meeting['Additional Location Information'], meeting['Comments']]
+        if meeting['Virtual Meeting Link']:
+            notes.append('Also online')
+        notes = '<br>'.join(escape(note) for note in notes if note)
+        if notes:
+            location += f'<br><span class="note">{notes}</span>'
+        parts.append('<tr>'
+                     f'<td class="time">{escape(meeting["Start Time"])}<br>'
+                     f'{escape(meeting["Duration"])} hrs</td>'
+                     f'<td class="name">{escape(meeting["Meeting Name"])}</td>'
+                     f'<td>{location}</td>'
+                     f'<td class="formats">{escape(meeting["Formats"])}</td>'
+                     '</tr>')
+    if day is None:
+        parts.append('<p>No meetings.</p>')
+    else:
+        parts.append('</table>')
+    parts += ['</body>', '</html>', '']
+    return '\n'.join(parts)
+
+
+def pdf_command(renderer:str, html_path:str, pdf_path:str) -> List[str]:
+    """Command line converting a page to PDF with a local renderer.
+
+    Args:
+        renderer (str): path of wkhtmltopdf, or of a Chromium/Chrome binary
+        html_path (str): page to convert
+        pdf_path (str): PDF to write
+
+    Returns:
+        List[str]: command
+    """
+    if 'chrom' in os.path.basename(renderer).lower():
+        return [renderer, '--headless', '--disable-gpu', '--no-pdf-header-footer',
+                '--print-to-pdf-no-header',
+                f'--print-to-pdf={os.path.abspath(pdf_path)}', os.path.abspath(html_path)]
+    return [renderer, '--quiet', '--page-size', 'A4', '--print-media-type', html_path, pdf_path]
+
+
+def write_schedule(task:dict) -> str:
+    """Render and write one list (and its PDF). Runs in a pool worker.
+
+    Args:
+        task (dict): path, title, meetings, updated date, output directory and
+            PDF renderer (None for no PDF)
+
+    Returns:
+        str: relative path written
+    """
+    html_path = os.path.join(task['schedule_dir'], task['path'] + '.html')
+    with open(html_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(render_schedule(task['title'], task['meetings'], task['updated']))
+    os.replace(html_path + '.tmp', html_path)
+    if task['renderer']:
+        pdf_path = os.path.join(task['schedule_dir'], task['path'] + '.pdf')
+        subprocess.run(pdf_command(task['renderer'], html_path, pdf_path + '.tmp'),
+                       check=True, capture_output=True, timeout=300)
+        os.replace(pdf_path + '.tmp', pdf_path)
+    return task['path']
+
+
+def load_manifest(schedule_dir:str = SCHEDULE_DIR) -> Dict[str, dict]:
+    """Read the list manifest (relative path -> meetings hash and modified time).
+
+    Args:
+        schedule_dir (str, optional): list directory. Defaults to SCHEDULE_DIR.
+
+    Returns:
+        Dict[str, dict]: manifest, empty if no lists have been written yet
+    """
+    try:
+        with open(os.path.join(schedule_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_schedules(meetings:pd.DataFrame, schedule_dir:str = SCHEDULE_DIR,
+                    renderer:str = None, workers:int = None) -> List[str]:
+    """Write the printable lists for the snapshot, rebuilding only the ones
+    whose meetings changed.
+
+    Args:
+        meetings (pd.DataFrame): meetings, with address fields, region and venue
+        schedule_dir (str, optional): output directory. Defaults to SCHEDULE_DIR.
+        renderer (str, optional): PDF renderer, see ``pdf_command``. Defaults
+            to None (HTML only).
+        workers (int, optional): pool processes. Defaults to one per CPU.
+
+    Returns:
+        List[str]: relative paths (without extension) of lists written or removed
+    """
+    manifest = load_manifest(schedule_dir)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    updated = now.astimezone(ZoneInfo(TIMEZONE)).strftime('%d %B %Y')
+    local = meetings.loc[meetings['venue'].isin(VENUE_TYPES)]
+    lists = {schedule_path(): ('NA Meetings - New Zealand', local)}
+    for region in sorted(local['region'].dropna().unique()):
+        lists[schedule_path(region)] = (f'NA Meetings - {region}',
+                                        local.loc[local['region'] == region])
+    entries = {}
+    tasks = []
+    for path, (title, selected) in lists.items():
+        records = schedule_meetings(selected)
+        digest = sha1(json.dumps([title, records]).encode('utf-8')).hexdigest()
+        previous = manifest.get(path)
+        exists = os.path.exists(os.path.join(schedule_dir, path + '.html')) and \
+            (not renderer or os.path.exists(os.path.join(schedule_dir, path + '.pdf')))
+        if previous and previous['hash'] == digest and exists:
+            entries[path] = previous
+            continue
+        entries[path] = {'hash': digest, 'modified': now.isoformat()}
+        tasks.append({'path': path, 'title': title, 'meetings': records, 'updated': updated,
+                      'schedule_dir': schedule_dir, 'renderer': renderer})
+    os.makedirs(schedule_dir, exist_ok=True)
+    changed = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write_schedule, task) for task in tasks]
+            for task, future in zip(tasks, futures):
+                try:
+                    changed.append(future.result())
+                except (OSError, subprocess.SubprocessError) as error:
+                    # Kept in the manifest without a hash, so it's tried again next time
+                    print(f'Could not write meeting list {task["path"]}: {error}')
+                    entries[task['path']]['hash'] = None
+    # Regions that no longer have meetings
+    for path in set(manifest) - set(entries):
+        for ext in ('.html', '.pdf'):
+            if os.path.exists(os.path.join(schedule_dir, path + ext)):
+                os.remove(os.path.join(schedule_dir, path + ext))
+        changed.append(path)
+    with open(os.path.join(schedule_dir, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(entries, f, indent=0, sort_keys=True)
+    os.replace(os.path.join(schedule_dir, MANIFEST + '.tmp'), os.path.join(schedule_dir, MANIFEST))
+    return changed
@@ -0,0 +1,18 @@
+"""Meeting start times, as the snapshot stores them ("7:00 PM")."""
+from datetime import datetime
+
+
+def start_minutes(start_time:str) -> int:
+    """Minutes past midnight of a display start time.
+
+    Args:
+        start_time (str): start time as stored in the snapshot, e.g. "7:00 PM"
+
+    Returns:
+        int: minutes past midnight, -1 if the time can't be read
+    """
+    try:
+        time = datetime.strptime(str(start_time).strip(), '%I:%M %p')
+    except ValueError:
+        return -1
+    return time.hour * 60 + time.minute
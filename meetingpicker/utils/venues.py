@@ -0,0 +1,107 @@
+"""Venues: the address fields meetings share, stored once each.
+
+Most venues host several meetings, and every meeting row used to carry its own
+copy of the venue's address.  The refresh step splits the addresses out into
+VENUE_FILE, one row per distinct address (compared after normalising case and
+whitespace), with the Location block shown in the meetings table rendered
+there once.  Meetings then refer to their venue by an integer venue_id, which
+stays the same from one refresh to the next while the address does.
+"""
+from hashlib import sha1
+from typing import Tuple, Union
+
+import pandas as pd
+
+
+VENUE_FILE = 'data/venues.csv'
+# Place names, shown on one line of the Location block
+PLACE_COLS = ['Neighborhood', 'Town', 'Borough', 'County', 'Zip Code', 'Nation']
+ADDRESS_COLS = ['Location Name', 'Street Address'] + PLACE_COLS + \
+               ['Additional Location Information', 'Bus Lines', 'Train Lines']
+# Pre-rendered HTML; a meeting's Comments go between the two when displayed
+RENDERED_COLS = ['Location', 'Transport']
+
+
+def clean(value) -> str:
+    """Text of a field, '' when missing."""
+    return '' if pd.isnull(value) else str(value).strip()
+
+
+def venue_key(row:pd.Series) -> str:
+    """Hash of a row's normalised address fields.
+
+    Args:
+        row (pd.Series): meeting or venue with the ADDRESS_COLS fields
+
+    Returns:
+        str: venue key
+    """
+    fields = [' '.join(clean(row[col]).split()).casefold() for col in ADDRESS_COLS]
+    return sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()[:16]
+
+
+def location_parts(row:pd.Series) -> Tuple[str, str]:
+    """HTML of the Location block for an address, in two parts.
+
+    Args:
+        row (pd.Series): meeting or venue with the ADDRESS_COLS fields
+
+    Returns:
+        Tuple[str, str]: the address, and the bus and train lines
+    """
+    location = '<br>'.join(filter(None, [
+        clean(row['Location Name']),
+        clean(row['Street Address']),
+        ', '.join(filter(None, [clean(row[col]) for col in PLACE_COLS])),
+        clean(row['Additional Location Information'])]))
+    transport = '<br>'.join(filter(None, [clean(row['Bus Lines']), clean(row['Train Lines'])]))
+    return location, transport
+
+
+def split_venues(meetings:pd.DataFrame,
+                 previous:pd.DataFrame = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Move the address fields of a meeting table into a venue table.
+
+    Args:
+        meetings (pd.DataFrame): meetings with the ADDRESS_COLS fields
+        previous (pd.DataFrame, optional): venue table from the last refresh,
+            whose venue ids are kept. Defaults to None.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: meetings with a venue_id column in
+        place of the address fields, and the venue table
+    """
+    keys = meetings.apply(venue_key, axis=1) if len(meetings) else pd.Series([], dtype=str)
+    ids = {} if previous is None else dict(zip(previous['venue_key'], previous['venue_id']))
+    next_id = max(ids.values(), default=0) + 1
+    venues = meetings[ADDRESS_COLS].assign(venue_key=keys.values).drop_duplicates('venue_key')
+    for key in venues['venue_key']:
+        if key not in ids:
+            ids[key] = next_id
+            next_id += 1
+    venues.insert(0, 'venue_id', venues['venue_key'].map(ids).astype(int))
+    parts = [location_parts(row) for _, row in venues.iterrows()]
+    venues['Location'] = [location for location, _ in parts]
+    venues['Transport'] = [transport for _, transport in parts]
+    venues = venues.sort_values('venue_id').reset_index(drop=True)
+    position = list(meetings.columns).index(ADDRESS_COLS[0])
+    meetings = meetings.drop(columns=ADDRESS_COLS)
+    meetings.insert(position, 'venue_id', keys.map(ids).astype(int).values)
+    return meetings, venues
+
+
+def load_venues(path:str = VENUE_FILE) -> Union[pd.DataFrame, None]:
+    """Read the venue table.
+
+    Args:
+        path (str, optional): venue CSV. Defaults to VENUE_FILE.
+
+    Returns:
+        Union[pd.DataFrame, None]: venues, None if there is no venue table
+    """
+    try:
+        venues = pd.read_csv(path, dtype=str)
+    except FileNotFoundError:
+        return None
+    venues['venue_id'] = venues['venue_id'].astype(int)
+    return venues
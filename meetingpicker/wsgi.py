@@ -15,3 +15,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ['DJANGO_SETTINGS_MODULE'] = 'meetingpicker.settings'
 
 application = get_wsgi_application()
+
+# Build the meeting snapshot before workers are forked, so they share its memory
+# (for servers that load the app once and fork, e.g. gunicorn --preload)
+if os.getenv('PRELOAD_SNAPSHOT') == 'True':
+    from meetingpicker.apps.picker.preload import preload
+    preload()
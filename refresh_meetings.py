@@ -1,22 +1,60 @@
 # -*- coding: utf-8 -*-
-
-import asyncio
+"""Refresh the meeting snapshot from the BMLT database.
+
+    python refresh_meetings.py                  # query MySQL, then build and publish
+    python refresh_meetings.py --from-extract   # rebuild from the last saved extract
+    python refresh_meetings.py --extract-only   # only query MySQL and save the extract
+    python refresh_meetings.py --daemon         # keep running, refreshing every --interval seconds
+
+The refresh runs in stages, each timed:
+
+- extract: run the BMLT queries and save the results, with their column
+  types, as a local extract in EXTRACT_DIR (--from-extract loads it instead)
+- transform: pivot meeting fields, attach formats, format days and times
+- join: place meetings in regions and work out their venue type
+- publish: write the snapshot, venues, history, calendar feeds, printable
+  meeting lists and map layers, then warm the picker cache (skipped with
+  --no-publish)
+
+Run from cron, every refresh starts a new interpreter, imports geopandas and
+pandas, connects to MySQL and reads the region shapes again. With --daemon the
+process stays up instead: the regions (re-read only when REGION_FILE changes)
+and the database connection are kept between refreshes, and a refresh whose
+query results match the last one stops after the extract. When a refresh
+publishes a new snapshot version, the web workers are told to reload (see
+``signal_workers``). A failed refresh is retried after a delay that doubles
+with each failure, up to MAX_BACKOFF.
+"""
+import argparse
 import calendar
-import pytz
-from datetime import datetime, timedelta
-from os import getenv
-from typing import List, Union
-
+import json
+import os
+import random
+import signal
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from os import environ, getenv
+from typing import Dict, Tuple, Union
+
+import django
 import geopandas as gp
-import MySQLdb as mysql
 import pandas as pd
+import pytz
+from django.core.management import call_command
 from dotenv import find_dotenv, load_dotenv
-from requests import request
 from shapely.geometry import Point
 
+from meetingpicker.utils.history import file_version, record_snapshot
+from meetingpicker.utils.ical import write_feeds
+from meetingpicker.utils.maps import write_region_layers
 from meetingpicker.utils.queries import (meeting_data_query,
                                          meeting_format_query,
                                          meeting_main_query)
+from meetingpicker.utils.schedules import write_schedules
+from meetingpicker.utils.venues import VENUE_FILE, load_venues, split_venues
 
 # Environments set in application settings in cPanel/Python app settings
 # Can be overriden with local file .env, for testing or updates
@@ -27,6 +65,16 @@ import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 
 REGION_FILE = 'static/regions.shp'
+SNAPSHOT_FILE = 'data/all_meetings.csv'
+EXTRACT_DIR = 'data/extract'
+# Daemon mode: seconds between refreshes (each moved by up to the jitter either
+# way, so refreshes don't line up with other scheduled jobs), and the longest
+# wait before retrying after failures
+REFRESH_INTERVAL = 300
+REFRESH_JITTER = 30
+MAX_BACKOFF = 3600
+# Touching this makes Passenger restart the app's workers
+RESTART_FILE = 'tmp/restart.txt'
 DAYS = {0: 'SUNDAY',
         1: 'MONDAY',
         2: 'TUESDAY',
@@ -45,6 +93,10 @@ with mysql.connect(user=USERNAME, password=PASSWORD, host=HOSTNAME, db=DB) as co
     print(cur.execute('select 1 as num')) # Will print 1 or return error
 """
 
+# Raw query results kept in the extract, by name
+EXTRACT_QUERIES = {'meeting_data': meeting_data_query,
+                   'meeting_main': meeting_main_query,
+                   'meeting_formats': meeting_format_query}
 
 MEETING_DETAIL_COLS = [ 'id_bigint',
                         'Meeting Name',
@@ -87,24 +139,127 @@ day_names = [DAYS[i] for i in day_list]
 day_list = [*range(7)]
 DAYS_ORDERED = {i:j for i, j in zip(day_names, day_list)}
 
-# Variables for dataframes
-ALL_MEETINGS = None
-ALL_REGIONS = None
-ALL_MEETINGS_ONLINE = None
-ALL_MEETINGS_INPERSON = None
-GEO_MEETINGS = None
-# Variables for async futures
-am_future = None
-ar_future = None
-gm_future = None
-amo_future = None
-ami_future = None
-
 
 class ProcessingError(Exception):
      pass  
 
 
+@contextmanager
+def timed(stage:str):
+    """Print how long a stage of the refresh took.
+
+    Args:
+        stage (str): stage name
+    """
+    start = time.perf_counter()
+    yield
+    print(f'{stage}: {time.perf_counter() - start:.1f}s')
+
+
+class Database:
+    """MySQL connection kept open from one refresh to the next, and opened
+    again when it has dropped.
+    """
+
+    def __init__(self):
+        self.conn = None
+
+    def connect(self):
+        """The open connection, after checking it's still alive.
+
+        Returns:
+            MySQLdb.connections.Connection: database connection
+        """
+        import MySQLdb as mysql
+        if self.conn is not None:
+            try:
+                self.conn.ping()
+                return self.conn
+            except mysql.Error:
+                self.close()
+        # Autocommit, so each refresh's queries see the latest data rather
+        # than the snapshot of a transaction left open by the first SELECT
+        self.conn = mysql.connect(user=USERNAME, password=PASSWORD, host=HOSTNAME, db=DB,
+                                  autocommit=True)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+def extract(conn=None) -> Dict[str, pd.DataFrame]:
+    """Run the BMLT queries.
+
+    Args:
+        conn (MySQLdb.connections.Connection, optional): open connection to 
+            use. Defaults to connecting for just these queries.
+
+    Returns:
+        Dict[str, pd.DataFrame]: raw query results, by name
+    """
+    if conn is not None:
+        return {name: pd.read_sql(con=conn, sql=query) for name, query in EXTRACT_QUERIES.items()}
+    # Only needed when querying the database, not when rebuilding from an extract
+    import MySQLdb as mysql
+    with mysql.connect(user=USERNAME, password=PASSWORD, host=HOSTNAME, db=DB) as conn:
+        return {name: pd.read_sql(con=conn, sql=query) for name, query in EXTRACT_QUERIES.items()}
+
+
+def same_extract(raw:Dict[str, pd.DataFrame], previous:Dict[str, pd.DataFrame]) -> bool:
+    """Whether two extracts hold the same query results.
+
+    Args:
+        raw (Dict[str, pd.DataFrame]): query results
+        previous (Dict[str, pd.DataFrame]): earlier query results
+
+    Returns:
+        bool: True if every table is identical
+    """
+    return raw.keys() == previous.keys() and all(raw[name].equals(previous[name]) for name in raw)
+
+
+def save_extract(raw:Dict[str, pd.DataFrame], extract_dir:str = EXTRACT_DIR) -> None:
+    """Store raw query results locally, keeping their column types.
+
+    Args:
+        raw (Dict[str, pd.DataFrame]): query results from ``extract``
+        extract_dir (str, optional): extract directory. Defaults to EXTRACT_DIR.
+    """
+    os.makedirs(extract_dir, exist_ok=True)
+    manifest = {'created': datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+                'tables': {}}
+    for name, frame in raw.items():
+        frame.to_pickle(os.path.join(extract_dir, f'{name}.pkl'))
+        manifest['tables'][name] = {'rows': len(frame),
+                                    'dtypes': {col: str(dtype) for col, dtype in frame.dtypes.items()}}
+    with open(os.path.join(extract_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_extract(extract_dir:str = EXTRACT_DIR) -> Dict[str, pd.DataFrame]:
+    """Read the raw query results saved by the last extract.
+
+    Args:
+        extract_dir (str, optional): extract directory. Defaults to EXTRACT_DIR.
+
+    Returns:
+        Dict[str, pd.DataFrame]: raw query results, by name
+    """
+    try:
+        with open(os.path.join(extract_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ProcessingError(f'No extract in {extract_dir} - run without --from-extract first')
+    print(f'Using extract from {manifest["created"]}')
+    return {name: pd.read_pickle(os.path.join(extract_dir, f'{name}.pkl'))
+            for name in manifest['tables']}
+
+
 def process_meeting_data(meeting_data:pd.DataFrame,
                           online:bool) -> pd.DataFrame:
     """Take BMLT-formatted MySQL table and process into 
@@ -142,25 +297,24 @@ def sort_on_day(series:pd.Series) -> pd.Series:
     return series.apply(lambda x: DAYS_ORDERED.get(x, 9999))
 
 
-def get_meeting_data(online:bool = False) -> pd.DataFrame:
-    """Return all meeting information. 
+def get_meeting_data(raw:Dict[str, pd.DataFrame], online:bool = False) -> pd.DataFrame:
+    """Return all meeting information (transform stage).
 
     Args:
+        raw (Dict[str, pd.DataFrame]): raw query results, from ``extract`` or ``load_extract``
         online (bool, optional): whether to filter for online meetings. Defaults to False.
 
     Returns:
         pd.DataFrame: Fully cleaned meetings
     """
-    with mysql.connect(user=USERNAME, password=PASSWORD, host=HOSTNAME, db=DB) as conn:
-        meeting_data = pd.read_sql(con=conn, sql=meeting_data_query)
-        meeting_data = process_meeting_data(meeting_data, online)
-        meeting_main = pd.read_sql(con=conn, sql=meeting_main_query)
-        meeting_main.columns = MEETING_MAIN_COLS
-        meeting_formats = pd.read_sql(con=conn, sql=meeting_format_query)
-        meeting_formats = {k:v for k, v in zip(meeting_formats['shared_id_bigint'].astype(str).values, 
-                                                meeting_formats['name_string'].values)}
-        meeting_main['Formats'] = meeting_main['Formats'].apply(lambda x: ', '.join([meeting_formats[i] \
-                                           for i in x.split(',')]) if not x=='' else '')
+    meeting_data = process_meeting_data(raw['meeting_data'], online)
+    meeting_main = raw['meeting_main'].copy()
+    meeting_main.columns = MEETING_MAIN_COLS
+    meeting_formats = raw['meeting_formats']
+    meeting_formats = {k:v for k, v in zip(meeting_formats['shared_id_bigint'].astype(str).values,
+                                            meeting_formats['name_string'].values)}
+    meeting_main['Formats'] = meeting_main['Formats'].apply(lambda x: ', '.join([meeting_formats[i] \
+                                       for i in x.split(',')]) if not x=='' else '')
     meeting_data = pd.merge(left=meeting_data,
                              right=meeting_main,
                             how='right',
@@ -180,162 +334,24 @@ def get_meeting_data(online:bool = False) -> pd.DataFrame:
     meeting_data.reset_index(drop=True, inplace=True)
     # Added following line to accomodate geopandas not importing datetime objects correctly
     meeting_data['Start Time'] = meeting_data['Real Time'].apply(lambda x: x.strftime('%H:%M:%S'))
-    meeting_data.drop(['id_bigint', 'Day Ordered', 'Real Time'], axis=1, inplace=True)
-    return meeting_data
-
-
-async def all_meetings(am_future:asyncio.Future) -> asyncio.Future:
-    """Asyncronous call to generate meeting dataframe. Returns as a future.
-
-    Args:
-        am_future (asyncio.Future): new empty future object
-
-    Returns:
-        asyncio.Future: future object, value is meeting dataframe
-    """
-    # GET ALL MEETING DATA. Perform once on page load and store in session
-    ALL_MEETINGS = get_meeting_data(online=False)
-    ALL_MEETINGS['geometry'] = [Point(i,j) for i, j in zip(ALL_MEETINGS['Longitude'].values,
-                                                        ALL_MEETINGS['Latitude'].values)]
-    ALL_MEETINGS = gp.GeoDataFrame(ALL_MEETINGS, crs='EPSG:4326', geometry='geometry')
-    am_future.set_result(ALL_MEETINGS)
-
-async def all_regions(ar_future:asyncio.Future) -> asyncio.Future:
-    """Asynchronous call to generate all regions. Returns as a future.
-
-    Args:
-        ar_future (asyncio.Future): new empty future object
-
-    Returns:
-        asyncio.Future: future object, value is all regions as shapely geometry
-    """
-    ALL_REGIONS = gp.read_file(REGION_FILE).geometry.unary_union
-    ALL_REGIONS = gp.GeoDataFrame(geometry=[ALL_REGIONS], crs='EPSG:4326')
-    ar_future.set_result(ALL_REGIONS)
-
-async def geo_meetings(am_future: asyncio.Future, gm_future:asyncio.Future) -> asyncio.Future:
-    """Asynchronous call to get all meetings as geopandas dataframe. Returns as a future.
-
-    Args:
-        gm_future (asyncio.Future): new empty future object
-
-    Returns:
-        asyncio.Future: future object, value is all meetings as geopandas dataframe
-    """
-    ALL_MEETINGS = await am_future
-    AR = gp.read_file(REGION_FILE)
-    AR = AR[['intl', 'geometry']]
-    GEO_MEETINGS = gp.GeoDataFrame(ALL_MEETINGS, crs='EPSG:4326', geometry='geometry')
-    # Join to add international column to GEO_MEETINGS
-    GEO_MEETINGS = gp.sjoin(GEO_MEETINGS, AR)
-    GEO_MEETINGS.drop(['index_right'], axis=1, inplace=True)
-    gm_future.set_result(GEO_MEETINGS)
-
-async def all_meetings_online(gm_future:asyncio.Future, amo_future:asyncio.Future) -> asyncio.Future:
-    """Asynchronous call to get all online meetings. Returns as a future.
-    
-    Args:
-        amo_future (asyncio.Future): new empty future object
-
-    Returns:
-        asyncio.Future: future object, value is all online meetings
-    """
-    GEO_MEETINGS = await gm_future
-    ALL_MEETINGS_ONLINE = GEO_MEETINGS[(~pd.isnull(GEO_MEETINGS['Virtual Meeting Link']) & \
-                                    (GEO_MEETINGS['Virtual Meeting Link'] != ''))]
-    amo_future.set_result(ALL_MEETINGS_ONLINE)
+    # id_bigint is kept as the stable key for calendar feeds
+    meeting_data.drop(['Day Ordered', 'Real Time'], axis=1, inplace=True)
+    return meeting_data 
 
 
-async def all_meetings_inperson(gm_future:asyncio.Future, ami_future:asyncio.Future) -> asyncio.Future:
-    """Asynchronous call to get all in-person meetings. Returns as a future.
+def join_regions(meetings:pd.DataFrame, regions:gp.GeoDataFrame) -> gp.GeoDataFrame:
+    """Place meetings in regions and set their venue type (join stage).
 
     Args:
-        ami_future (asyncio.Future): new empty future
+        meetings (pd.DataFrame): meetings from ``get_meeting_data``
+        regions (gp.GeoDataFrame): regions from REGION_FILE
 
     Returns:
-        asyncio.Future: future object, value is all in-person meetings
-    """
-    GEO_MEETINGS = await gm_future
-    # Filter to just in-person meetings
-    ALL_MEETINGS_INPERSON = GEO_MEETINGS[(~pd.isnull(GEO_MEETINGS['Street Address']) & \
-                                        (GEO_MEETINGS['Street Address'] != ''))]
-    ami_future.set_result(ALL_MEETINGS_INPERSON)
-    
-
-async def run():
-    # Call all asynchronous functions.
-    # Create future objects (that can be awaited in subsequent methods)
-    # and pass them to the async functions
-    loop = asyncio.get_running_loop()
-    global am_future, ar_future, gm_future, amo_future, ami_future, r_future
-    am_future = loop.create_future()
-    ar_future = loop.create_future()
-    gm_future = loop.create_future()
-    amo_future = loop.create_future()
-    ami_future = loop.create_future()
-    # Call all async functions
-    loop.create_task(all_meetings(am_future))
-    loop.create_task(all_regions(ar_future))
-    loop.create_task(geo_meetings(am_future, gm_future))
-    loop.create_task(all_meetings_online(gm_future, amo_future))
-    loop.create_task(all_meetings_inperson(gm_future, ami_future))
-
-
-def sort_on_day(series:pd.Series) -> pd.Series:
-	"""Sort a series of days in order of the week, starting with the current day.
-
-	Args:
-		series (pd.Series): Pandas series
-
-	Returns:
-		pd.Series: Pandas series, sorted
-	"""
-	return series.apply(lambda x: DAYS_ORDERED.get(x, 9999))
-
-
-async def process_meetings(ALL_MEETINGS,
-                           ALL_REGIONS,
-                           ALL_MEETINGS_ONLINE,
-                           ALL_MEETINGS_INPERSON,
-                           ):
-    """Combine region and meeting data
-    """
-    # Issue with geopandas formatting - ensure datetimes are in correct format
-    for df in (ALL_MEETINGS, ALL_MEETINGS_ONLINE, ALL_MEETINGS_INPERSON):
-        df['Start Time'] = pd.to_datetime(df['Start Time'], format='%H:%M:00')
-        # Roundabout method for sorting first on day of the week, THEN on time
-        df['DayTime'] = df.apply(lambda x: ((DAYS_ORDERED.get(x['Day'], 9999)+1)*10000) * \
-                                (86400 - (x['Start Time'] - datetime(1900,1,1)).seconds), 
-                                axis=1)
-        df.sort_values(by='DayTime', inplace=True)
-        df.drop('DayTime', axis=1, inplace=True)
-        df['Start Time'] = df['Start Time'].dt.strftime('%I:%M %p')
-        df['Start Time'] = df['Start Time'].apply(lambda x: str(x)[1:] if str(x)[0] == '0' \
-                                                else str(x))
-        df['Duration'] = pd.to_datetime(df['Duration'], format='%H:%M:00')
-        df['Duration'] = df['Duration'].dt.strftime('%H:%M')
-        df['Duration'] = df['Duration'].apply(lambda x: str(x)[1:] if str(x)[0] == '0' \
-                                            else str(x))
-    # UPDATED: 17-02-2024 -> filter out international meetings 
-    ALL_MEETINGS = ALL_MEETINGS.loc[ALL_MEETINGS['intl']==0]
-    ALL_MEETINGS_ONLINE = ALL_MEETINGS_ONLINE.loc[ALL_MEETINGS_ONLINE['intl']==0]
-    ALL_MEETINGS_INPERSON = ALL_MEETINGS_INPERSON.loc[ALL_MEETINGS_INPERSON['intl']==0]
-    
-
-async def save_all():
-    """Wrapper function to save all async functions as global variables.
+        gp.GeoDataFrame: local meetings, with region and venue, as written to the snapshot
     """
-    ALL_MEETINGS = await am_future
-    ALL_REGIONS = await ar_future
-    # Rules for sorting tables 
-    today = datetime.today()
-    weekday = calendar.weekday(today.year, today.month, today.day) 
-    start_list = list(range(weekday, 7, 1))
-    end_list = list(range(0, weekday))
-    day_list = start_list + end_list 
-    day_names = [DAYS[i] for i in day_list]
-    day_list = [*range(7)]
-    DAYS_ORDERED = {i:j for i, j in zip(day_names, day_list)}
+    meetings['geometry'] = [Point(i,j) for i, j in zip(meetings['Longitude'].values,
+                                                       meetings['Latitude'].values)]
+    ALL_MEETINGS = gp.GeoDataFrame(meetings, crs='EPSG:4326', geometry='geometry')
     # Issue with geopandas formatting - ensure datetimes are in correct format
     for df in (ALL_MEETINGS,):
         df['Start Time'] = pd.to_datetime(df['Start Time'], format='%H:%M:00')
@@ -352,9 +368,7 @@ async def save_all():
         df['Duration'] = df['Duration'].dt.strftime('%H:%M')
         df['Duration'] = df['Duration'].apply(lambda x: str(x)[1:] if str(x)[0] == '0' \
                                             else str(x))
-    # Read region data
-    REGIONS = gp.read_file(REGION_FILE)
-    ALL_MEETINGS = gp.sjoin(ALL_MEETINGS, REGIONS)
+    ALL_MEETINGS = gp.sjoin(ALL_MEETINGS, regions)
     ALL_MEETINGS['venue'] = ''
     ALL_MEETINGS.loc[(~pd.isnull(ALL_MEETINGS['Street Address'])) & \
 			   						(ALL_MEETINGS['Street Address'] != ''),
@@ -371,15 +385,200 @@ async def save_all():
     ALL_MEETINGS.reset_index(drop=True, inplace=True)
     # Only local meetings 
     ALL_MEETINGS = ALL_MEETINGS.loc[ALL_MEETINGS['intl']==0]
-    # Drop unneeded columns
+    # Drop unneeded columns (coordinates are kept for the map)
     ALL_MEETINGS.drop(columns=['geometry', 'index_right', 'id', 
-                               'layer', 'path', 'intl', 'Longitude', 
-                               'Latitude'], axis=1, inplace=True)
-    ALL_MEETINGS.to_csv('data/all_meetings.csv', index=False)
+                               'layer', 'path', 'intl'], axis=1, inplace=True)
+    return ALL_MEETINGS
 
 
-if __name__ == '__main__':
-    asyncio.run(run())
-    asyncio.run(save_all())
+def publish(meetings:pd.DataFrame, regions:gp.GeoDataFrame,
+            region_layers:bool = True) -> Union[str, None]:
+    """Write everything the web app serves from (publish stage).
 
+    Args:
+        meetings (pd.DataFrame): meetings from ``join_regions``
+        regions (gp.GeoDataFrame): regions from REGION_FILE
+        region_layers (bool, optional): whether to write the map's region 
+            layers. Defaults to True.
 
+    Returns:
+        Union[str, None]: new snapshot version, None if the snapshot is unchanged
+    """
+    # Addresses are stored once per venue, with the Location block pre-rendered
+    snapshot, venues = split_venues(meetings, load_venues())
+    venues.to_csv(VENUE_FILE, index=False)
+    snapshot.to_csv(SNAPSHOT_FILE, index=False)
+    print(f'{len(snapshot)} meetings at {len(venues)} venues')
+    # Keep a delta against the previous version for /changes/ consumers
+    version = record_snapshot(SNAPSHOT_FILE, VENUE_FILE)
+    print(f'New snapshot version {version}' if version else 'Snapshot unchanged')
+    # Calendar feeds - only those whose meetings changed are rewritten
+    changed = write_feeds(meetings)
+    print(f'{len(changed)} calendar feeds updated')
+    # Printable meeting lists - likewise only rebuilt for regions that changed
+    changed = write_schedules(meetings, renderer=getenv('PDF_RENDERER'))
+    print(f'{len(changed)} meeting lists updated')
+    if region_layers:
+        # Region outlines for the map, simplified per zoom level
+        write_region_layers(regions)
+    return version
+
+
+def warm_cache() -> None:
+    """Compute the current snapshot's picker responses into the shared cache,
+    ready for when the web workers reload onto it. Nothing is done when the
+    picker cache is local to each process, as no worker would see it.
+    """
+    environ.setdefault('DJANGO_SETTINGS_MODULE', 'meetingpicker.settings')
+    django.setup()
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+    if isinstance(caches['picker'], LocMemCache):
+        print('Picker cache is local to each process; nothing to warm')
+        return
+    from meetingpicker.apps.picker import views
+    from meetingpicker.apps.picker.snapshot import load_snapshot
+    # A daemon imported the views (and their snapshot) on an earlier refresh
+    if views.SNAPSHOT.version != file_version(SNAPSHOT_FILE, VENUE_FILE):
+        views.use_snapshot(load_snapshot())
+    call_command('warm_cache')
+
+
+def signal_workers() -> None:
+    """Tell the web workers a new snapshot has been published, so they reload
+    onto it: send SIGHUP to the app server whose pid is in the file named by
+    the RELOAD_PIDFILE environment variable (a graceful reload for gunicorn 
+    and uWSGI), or without one, touch Passenger's RESTART_FILE.
+    """
+    pidfile = getenv('RELOAD_PIDFILE')
+    if pidfile:
+        with open(pidfile) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGHUP)
+        print(f'Sent SIGHUP to app server {pid}')
+        return
+    os.makedirs(os.path.dirname(RESTART_FILE), exist_ok=True)
+    with open(RESTART_FILE, 'a'):
+        os.utime(RESTART_FILE)
+    print(f'Touched {RESTART_FILE}')
+
+
+def load_regions(loaded:Tuple[float, gp.GeoDataFrame] = None) -> Tuple[float, gp.GeoDataFrame]:
+    """Read REGION_FILE, unless it hasn't changed since it was last read.
+
+    Args:
+        loaded (Tuple[float, gp.GeoDataFrame], optional): modification time and
+            regions from the last read. Defaults to None.
+
+    Returns:
+        Tuple[float, gp.GeoDataFrame]: modification time and regions
+    """
+    mtime = os.path.getmtime(REGION_FILE)
+    if loaded is not None and loaded[0] == mtime:
+        return loaded
+    return mtime, gp.read_file(REGION_FILE)
+
+
+def run_daemon(interval:float = REFRESH_INTERVAL, jitter:float = REFRESH_JITTER) -> None:
+    """Refresh every interval until stopped with SIGTERM or SIGINT, keeping
+    the regions and database connection between refreshes.
+
+    Args:
+        interval (float, optional): seconds between refreshes. Defaults to REFRESH_INTERVAL.
+        jitter (float, optional): most seconds each wait is moved by, either 
+            way. Defaults to REFRESH_JITTER.
+    """
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    db = Database()
+    regions = None
+    # Regions whose map layers have been written
+    layered = None
+    previous = None
+    # A published snapshot the workers haven't been told about yet
+    pending = False
+    failures = 0
+    print(f'Refreshing every {interval:.0f}s (+/- {jitter:.0f}s)')
+    while not stop.is_set():
+        try:
+            print(f'Refresh at {datetime.now(timezone.utc).replace(microsecond=0).isoformat()}')
+            with timed('extract'):
+                raw = extract(db.connect())
+            if previous is not None and same_extract(raw, previous):
+                print('Query results unchanged')
+            else:
+                save_extract(raw)
+                with timed('transform'):
+                    meetings = get_meeting_data(raw)
+                with timed('join'):
+                    regions = load_regions(regions)
+                    meetings = join_regions(meetings, regions[1])
+                with timed('publish'):
+                    version = publish(meetings, regions[1], region_layers=regions is not layered)
+                layered = regions
+                previous = raw
+                pending = pending or bool(version)
+            if pending:
+                with timed('warm cache'):
+                    warm_cache()
+                signal_workers()
+                pending = False
+            failures = 0
+            delay = interval
+        except Exception:
+            traceback.print_exc()
+            db.close()
+            failures += 1
+            delay = min(interval * 2 ** failures, MAX_BACKOFF)
+            print(f'Refresh failed ({failures} in a row), retrying in {delay:.0f}s')
+        stop.wait(max(0, delay + random.uniform(-jitter, jitter)))
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the meeting snapshot from the BMLT database.')
+    parser.add_argument('--from-extract', action='store_true',
+                        help='Rebuild from the saved extract instead of querying MySQL.')
+    parser.add_argument('--extract-only', action='store_true',
+                        help='Query MySQL and save the extract, nothing else.')
+    parser.add_argument('--no-publish', action='store_true',
+                        help='Run the transform and join stages without writing anything.')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running, refreshing from MySQL every --interval seconds.')
+    parser.add_argument('--interval', type=float, default=REFRESH_INTERVAL,
+                        help=f'Daemon: seconds between refreshes. Defaults to {REFRESH_INTERVAL}.')
+    parser.add_argument('--jitter', type=float, default=REFRESH_JITTER,
+                        help=f'Daemon: most seconds to move each refresh by. Defaults to {REFRESH_JITTER}.')
+    args = parser.parse_args()
+    if args.daemon:
+        if args.from_extract or args.extract_only or args.no_publish:
+            parser.error('--daemon refreshes from MySQL and publishes every time')
+        run_daemon(args.interval, args.jitter)
+        return
+    if args.from_extract:
+        with timed('load extract'):
+            raw = load_extract()
+    else:
+        with timed('extract'):
+            raw = extract()
+            save_extract(raw)
+    if args.extract_only:
+        return
+    with timed('transform'):
+        meetings = get_meeting_data(raw)
+    with timed('join'):
+        regions = gp.read_file(REGION_FILE)
+        meetings = join_regions(meetings, regions)
+    if args.no_publish:
+        print(f'{len(meetings)} meetings')
+        return
+    with timed('publish'):
+        version = publish(meetings, regions)
+    if version:
+        with timed('warm cache'):
+            warm_cache()
+
+
+if __name__ == '__main__':
+    main()